@@ -55,6 +55,8 @@ def are_tiles_overlapping(tile1, tile2):
                 return True
     return False
 
+NEIGHBOR_OFFSETS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+
 # Modifies grid
 def get_contiguous_section(grid, starting_point):
     row = starting_point[0]
@@ -65,16 +67,28 @@ def get_contiguous_section(grid, starting_point):
     if grid[row][col] == 1:
         raise Exception('Starting point already occupied')
 
+    # Depth-first over an explicit stack of (point, next neighbor to try)
+    # rather than recursing, so big sections don't hit the recursion limit.
+    # Points come out in the same order recursing would give.
     grid[row][col] = 1
     result = [starting_point]
-    if 0 <= row - 1 and grid[row - 1][col] == 0:
-        result = result + get_contiguous_section(grid, (row - 1, col))
-    if row + 1 < len(grid) and grid[row + 1][col] == 0:
-        result = result + get_contiguous_section(grid, (row + 1, col))
-    if 0 <= col - 1 and grid[row][col - 1] == 0:
-        result = result + get_contiguous_section(grid, (row, col - 1))
-    if col + 1 < len(grid[0]) and grid[row][col + 1] == 0:
-        result = result + get_contiguous_section(grid, (row, col + 1))
+    stack = [None] * (len(grid) * len(grid[0]))
+    stack[0] = (starting_point, 0)
+    top = 0
+    while top >= 0:
+        point, neighbor_index = stack[top]
+        if neighbor_index == len(NEIGHBOR_OFFSETS):
+            top -= 1
+            continue
+        stack[top] = (point, neighbor_index + 1)
+
+        row = point[0] + NEIGHBOR_OFFSETS[neighbor_index][0]
+        col = point[1] + NEIGHBOR_OFFSETS[neighbor_index][1]
+        if 0 <= row < len(grid) and 0 <= col < len(grid[0]) and grid[row][col] == 0:
+            grid[row][col] = 1
+            result.append((row, col))
+            top += 1
+            stack[top] = ((row, col), 0)
 
     return result
 
@@ -120,9 +134,27 @@ def can_fill_all_sections_after_placing_tile(grid, tile_set, tile):
 
     return not has_invalid_contiguous_sections(grid_after_placing_tiles)
 
-perf_can_add_tile_to_set = []
+# Total time spent in something and how many times it was timed. Only the
+# running totals are kept, so timing doesn't grow memory with every call.
+class PerfStat:
+    total_ns = 0
+    count = 0
+
+    def reset(self):
+        self.total_ns = 0
+        self.count = 0
+
+    def record_since(self, start_ns):
+        self.total_ns += time.perf_counter_ns() - start_ns
+        self.count += 1
+
+    @property
+    def total_seconds(self):
+        return self.total_ns / 10 ** 9
+
+perf_can_add_tile_to_set = PerfStat()
 def can_add_tile_to_set(grid, tile_set, tile):
-    start_time = time.time()
+    perf_start = time.perf_counter_ns()
     for points in tile:
         if grid[points[0]][points[1]] == 1:
             return False
@@ -132,9 +164,7 @@ def can_add_tile_to_set(grid, tile_set, tile):
             return False
 
     result = can_fill_all_sections_after_placing_tile(grid, tile_set, tile)
-    end_time = time.time()
-    global perf_can_add_tile_to_set
-    perf_can_add_tile_to_set.append(end_time - start_time)
+    perf_can_add_tile_to_set.record_since(perf_start)
     return result
 
 def get_free_space_count_for_grid(grid):
@@ -152,50 +182,88 @@ def print_solution(solution_set, height, width):
         print('')
     print('\n----------\n')
 
-perf_count_solutions_first_ops = []
+perf_count_solutions_first_ops = PerfStat()
 solutions_evaluated = 0
 shape_cache = {}
-def count_solutions(grid, solution_set, remaining_tiles, target_length):
-    time_start = time.time()
+# Returns (count, None) if the count for the solution set is known right
+# away, or else (None, frame) with the frame for counting it. A frame is
+# [solution set, remaining tiles, index of the next tile to try, solutions
+# so far, shape cache key].
+def visit_solution_set(grid, solution_set, remaining_tiles, target_length):
+    perf_start = time.perf_counter_ns()
     grid_after_placing_tiles = copy.deepcopy(grid)
     for tile in solution_set:
         for point in tile:
             grid_after_placing_tiles[point[0]][point[1]] = 1
     flattened = [str(col) for row in grid_after_placing_tiles for col in row]
     shape_cache_key = ''.join(flattened)
-    time_end = time.time()
-    global perf_count_solutions_first_ops
-    perf_count_solutions_first_ops.append(time_end - time_start)
+    perf_count_solutions_first_ops.record_since(perf_start)
 
     global solutions_evaluated
     global shape_cache
     if shape_cache_key in shape_cache:
-        return shape_cache[shape_cache_key]
+        return shape_cache[shape_cache_key], None
 
     if len(solution_set) == target_length:
         # print_solution(solution_set, len(grid), len(grid[0]))
         solutions_evaluated += 1
-        return 1
+        return 1, None
 
-    solutions_count = 0
-    for i in range(len(remaining_tiles)):
-        next_tile = remaining_tiles[i]
-        if can_add_tile_to_set(grid, solution_set, next_tile):
-            solutions_count += count_solutions(
-                grid,
-                solution_set + [next_tile],
-                remaining_tiles[i:],
-                target_length
-            )
-        else:
-            solutions_evaluated += 1
-        #     print_solution(solution_set + [next_tile], len(grid), len(grid[0]))
-
-    # Once we've seen a particular shape, cache the count of solutions for it
-    # print('{} : {}'.format(shape_cache_key, solutions_count))
-    shape_cache[shape_cache_key] = solutions_count
-
-    return solutions_count
+    return None, [solution_set, remaining_tiles, 0, 0, shape_cache_key]
+
+# Depth-first over an explicit stack of frames rather than recursing, so deep
+# grids don't hit the recursion limit. Every frame below the top has added
+# one tile to the solution set, so the stack is preallocated to the number
+# of tiles in a solution. target_length is a float when the free space
+# count isn't a multiple of the tile length, so it's rounded down.
+def count_solutions(grid, solution_set, remaining_tiles, target_length):
+    global solutions_evaluated
+
+    count, frame = visit_solution_set(grid, solution_set, remaining_tiles, target_length)
+    if frame is None:
+        return count
+
+    frames = [None] * (int(target_length) - len(solution_set) + 1)
+    frames[0] = frame
+    top = 0
+    while True:
+        solution_set, remaining_tiles, i, solutions_count, shape_cache_key = frame
+
+        # Find the next tile that can be added, if there are any left
+        child_frame = None
+        while i < len(remaining_tiles):
+            next_tile = remaining_tiles[i]
+            i += 1
+            if can_add_tile_to_set(grid, solution_set, next_tile):
+                count, child_frame = visit_solution_set(
+                    grid,
+                    solution_set + [next_tile],
+                    remaining_tiles[i - 1:],
+                    target_length
+                )
+                if child_frame is not None:
+                    break
+                solutions_count += count
+            else:
+                solutions_evaluated += 1
+            #     print_solution(solution_set + [next_tile], len(grid), len(grid[0]))
+        frame[2] = i
+        frame[3] = solutions_count
+
+        if child_frame is not None:
+            top += 1
+            frames[top] = frame = child_frame
+            continue
+
+        # Once we've seen a particular shape, cache the count of solutions for it
+        # print('{} : {}'.format(shape_cache_key, solutions_count))
+        shape_cache[shape_cache_key] = solutions_count
+        frames[top] = None
+        top -= 1
+        if top < 0:
+            return solutions_count
+        frame = frames[top]
+        frame[3] += solutions_count
 
 def create_compatibility_bitmap(tiles):
     compatibility_bitmap = [0] * len(tiles)
@@ -348,6 +416,9 @@ def brick_tiling(grid):
     # ]
     print('elimination:')
 
+    perf_can_add_tile_to_set.reset()
+    perf_count_solutions_first_ops.reset()
+
     perf_prep_start = time.time()
     converted_grid = []
     for i in range(len(grid)):
@@ -364,8 +435,10 @@ def brick_tiling(grid):
     perf_count_solutions_end = time.time()
     print('perf_prep time: {}'.format(perf_prep_end - perf_prep_start))
     print('perf_count_solutions time: {}'.format(perf_count_solutions_end - perf_count_solutions_start))
-    print('perf_can_add_tile_to_set: {}'.format(sum(perf_can_add_tile_to_set)))
-    print('perf_count_solutions_first_ops: {}'.format(sum(perf_count_solutions_first_ops)))
+    print('perf_can_add_tile_to_set: {}'.format(perf_can_add_tile_to_set.total_seconds))
+    print('perf_count_solutions_first_ops: {}'.format(perf_count_solutions_first_ops.total_seconds))
+
+    return count
 
 
 
@@ -501,8 +574,9 @@ test_cases = [
     ]
 ]
 
-for test_case in test_cases:
-    brick_tiling(test_case)
+if __name__ == '__main__':
+    for test_case in test_cases:
+        brick_tiling(test_case)
 
 
 # if __name__ == '__main__':
@@ -247,7 +247,7 @@ def brick_tiling(text_grid):
     perf_end = time.time()
     print('time: {}'.format(perf_end - perf_beg))
 
-    return 0
+    return count
 
 # max height = 20
 # max width = 8
@@ -282,8 +282,9 @@ test_cases = [
     # ]
 ]
 
-for test_case in test_cases:
-    brick_tiling(test_case)
+if __name__ == '__main__':
+    for test_case in test_cases:
+        brick_tiling(test_case)
 
 
 # if __name__ == '__main__':
@@ -53,6 +53,8 @@ def generate_placeable_tiles_for_grid(grid):
                 generate_placeable_tiles_for_point(grid, i, j)
     return placeable_tiles
 
+NEIGHBOR_OFFSETS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+
 # Modifies grid
 def get_contiguous_section(grid, starting_point):
     row = starting_point[0]
@@ -63,16 +65,28 @@ def get_contiguous_section(grid, starting_point):
     if grid[row][col] == 1:
         raise Exception('Starting point already occupied')
 
+    # Depth-first over an explicit stack of (point, next neighbor to try)
+    # rather than recursing, so big sections don't hit the recursion limit.
+    # Points come out in the same order recursing would give.
     grid[row][col] = 1
     result = [starting_point]
-    if 0 <= row - 1 and grid[row - 1][col] == 0:
-        result = result + get_contiguous_section(grid, (row - 1, col))
-    if row + 1 < len(grid) and grid[row + 1][col] == 0:
-        result = result + get_contiguous_section(grid, (row + 1, col))
-    if 0 <= col - 1 and grid[row][col - 1] == 0:
-        result = result + get_contiguous_section(grid, (row, col - 1))
-    if col + 1 < len(grid[0]) and grid[row][col + 1] == 0:
-        result = result + get_contiguous_section(grid, (row, col + 1))
+    stack = [None] * (len(grid) * len(grid[0]))
+    stack[0] = (starting_point, 0)
+    top = 0
+    while top >= 0:
+        point, neighbor_index = stack[top]
+        if neighbor_index == len(NEIGHBOR_OFFSETS):
+            top -= 1
+            continue
+        stack[top] = (point, neighbor_index + 1)
+
+        row = point[0] + NEIGHBOR_OFFSETS[neighbor_index][0]
+        col = point[1] + NEIGHBOR_OFFSETS[neighbor_index][1]
+        if 0 <= row < len(grid) and 0 <= col < len(grid[0]) and grid[row][col] == 0:
+            grid[row][col] = 1
+            result.append((row, col))
+            top += 1
+            stack[top] = ((row, col), 0)
 
     return result
 
@@ -110,35 +124,35 @@ def remove_tile_from_grid(grid, tile):
             raise Exception('Cannot remove')
         grid[point[0]][point[1]] = 0
 
-contig_section_cache = {}
-def add_contig_section_to_cache(contiguous_section, can_solve):
-    max_n = max([point[0] for point in contiguous_section])
-
-    def invert(cs):
-        return [(max_n - point[0], point[1]) for point in cs]
-
-    def rotate_90(cs):
-        return [(point[1], max_n - point[0]) for point in cs]
-
-    # for _ in range(4):
-    #     key = str(contiguous_section)
-    #     contig_section_cache[key] = can_solve
-    #     contiguous_section = rotate_90(contiguous_section)
-
-    key = str(contiguous_section)
-    contig_section_cache[key] = can_solve
+# The set of L tiles is closed under rotation and reflection, so whether a
+# section can be solved is the same for all of its rotated and reflected
+# copies. They all share one key: the smallest of the transformed sections.
+def create_canonical_key_for_contiguous_section(contiguous_section):
+    min_n = min([point[0] for point in contiguous_section])
+    min_m = min([point[1] for point in contiguous_section])
+    max_n = max([point[0] for point in contiguous_section]) - min_n
+    max_m = max([point[1] for point in contiguous_section]) - min_m
+    normalized = [(point[0] - min_n, point[1] - min_m) for point in contiguous_section]
+
+    # Each of the 8 symmetries of a square (4 rotations, each optionally
+    # mirrored), kept shifted to the origin
+    candidates = [
+        sorted(normalized),
+        sorted([(n, max_m - m) for n, m in normalized]),
+        sorted([(max_n - n, m) for n, m in normalized]),
+        sorted([(max_n - n, max_m - m) for n, m in normalized]),
+        sorted([(m, n) for n, m in normalized]),
+        sorted([(m, max_n - n) for n, m in normalized]),
+        sorted([(max_m - m, n) for n, m in normalized]),
+        sorted([(max_m - m, max_n - n) for n, m in normalized])
+    ]
+    return str(min(candidates))
 
-    inverted = invert(contiguous_section)
-    key = str(inverted)
+contig_section_cache = {}
+def add_contig_section_to_cache(key, can_solve):
     contig_section_cache[key] = can_solve
 
-    # for _ in range(4):
-    #     key = str(inverted)
-    #     contig_section_cache[key] = can_solve
-    #     contiguous_section = rotate_90(inverted)
-
-def get_cached_contig_section_result(contiguous_section):
-    key = str(contiguous_section)
+def get_cached_contig_section_result(key):
     return contig_section_cache[key] if key in contig_section_cache else None
 
 def noramlize_contiguous_section(contiguous_section):
@@ -154,13 +168,14 @@ def can_solve_contiguous_section(contiguous_section):
 
     normalized_cs = noramlize_contiguous_section(contiguous_section)
 
-    cached_result = get_cached_contig_section_result(contiguous_section)
+    key = create_canonical_key_for_contiguous_section(normalized_cs)
+    cached_result = get_cached_contig_section_result(key)
     if cached_result is not None:
         contig_section_cache_hits += 1
         return cached_result
 
     if len(normalized_cs) % TILE_SIZE != 0:
-        add_contig_section_to_cache(contiguous_section, False)
+        add_contig_section_to_cache(key, False)
         return False
 
     shape_test_grid = []
@@ -181,7 +196,7 @@ def can_solve_contiguous_section(contiguous_section):
             else:
                 line_count = 0
             if line_count >= 3:
-                add_contig_section_to_cache(contiguous_section, False)
+                add_contig_section_to_cache(key, False)
                 return False
 
     # Check for 3 points in a col without a free horizontal space (violates L shape)
@@ -196,7 +211,7 @@ def can_solve_contiguous_section(contiguous_section):
             else:
                 line_count = 0
             if line_count >= 3:
-                add_contig_section_to_cache(contiguous_section, False)
+                add_contig_section_to_cache(key, False)
                 return False
 
     # three_in_horz_line = True
@@ -212,35 +227,53 @@ def can_solve_contiguous_section(contiguous_section):
     # TODO: Is square?
     # Could keep map of no-solution shapes?
 
-    add_contig_section_to_cache(contiguous_section, True)
+    add_contig_section_to_cache(key, True)
     return True
 
-perf_deep_copy = []
-perf_find_first_free_space = []
-perf_get_contiguous_section = []
-perf_can_solve_contiguous_section = []
+# Total time spent in something and how many times it was timed. Only the
+# running totals are kept, so timing doesn't grow memory with every call.
+class PerfStat:
+    total_ns = 0
+    count = 0
+
+    def reset(self):
+        self.total_ns = 0
+        self.count = 0
+
+    def record_since(self, start_ns):
+        self.total_ns += time.perf_counter_ns() - start_ns
+        self.count += 1
+
+    @property
+    def total_seconds(self):
+        return self.total_ns / 10 ** 9
+
+perf_deep_copy = PerfStat()
+perf_find_first_free_space = PerfStat()
+perf_get_contiguous_section = PerfStat()
+perf_can_solve_contiguous_section = PerfStat()
 def can_solve_grid(grid):
-    perf_start = time.time()
+    perf_start = time.perf_counter_ns()
     grid_copy = deep_copy_grid(grid)
-    perf_deep_copy.append(time.time() - perf_start)
+    perf_deep_copy.record_since(perf_start)
 
-    perf_start = time.time()
+    perf_start = time.perf_counter_ns()
     free_space = el_find_first_free_space(grid_copy, (0, 0))
-    perf_find_first_free_space.append(time.time() - perf_start)
+    perf_find_first_free_space.record_since(perf_start)
     while free_space:
-        perf_start = time.time()
+        perf_start = time.perf_counter_ns()
         contiguous_section = get_contiguous_section(grid_copy, free_space)
-        perf_get_contiguous_section.append(time.time() - perf_start)
+        perf_get_contiguous_section.record_since(perf_start)
 
-        perf_start = time.time()
+        perf_start = time.perf_counter_ns()
         can_solve = can_solve_contiguous_section(contiguous_section)
-        perf_can_solve_contiguous_section.append(time.time() - perf_start)
+        perf_can_solve_contiguous_section.record_since(perf_start)
         if not can_solve:
             return False
 
-        perf_start = time.time()
+        perf_start = time.perf_counter_ns()
         free_space = el_find_first_free_space(grid_copy, free_space)
-        perf_find_first_free_space.append(time.time() - perf_start)
+        perf_find_first_free_space.record_since(perf_start)
 
     return True
 
@@ -296,49 +329,90 @@ def get_cached_grid_solution_count(grid):
 # perf_is_grid_solved = []
 el_solutions_evaluated = 0
 cache_hits = 0
-def count_solutions_for_grid(grid, remaining_tiles, depth):
+# Returns (count, None) if the grid's count is known right away, or else
+# (None, frame) with the frame for counting it. A frame is [tiles that can
+# still be placed, index of the next one to try, solutions so far, depth].
+def visit_grid(grid, remaining_tiles, depth):
     global el_solutions_evaluated
-    global cache_hits
 
     el_solutions_evaluated += 1
-    print_indent('Exploring grid:', depth)
-    print_grid(grid, depth)
+    if DEBUG:
+        print_indent('Exploring grid:', depth)
+        print_grid(grid, depth)
 
     if is_grid_filled(grid):
-        return 1
+        return 1, None
 
-    solutions_count = 0
     remaining_tiles = [tile for tile in remaining_tiles if can_place_tile_on_grid(grid, tile)]
-    for i in range(len(remaining_tiles)):
+    return None, [remaining_tiles, 0, 0, depth]
+
+# Depth-first over an explicit stack of frames rather than recursing, so deep
+# grids don't hit the recursion limit. Every frame below the top has placed
+# one tile, and a tile fills 4 spaces, so the stack is preallocated to that.
+# A frame's count is cached when it's popped.
+def count_solutions_for_grid(grid, remaining_tiles, depth):
+    global cache_hits
+
+    count, frame = visit_grid(grid, remaining_tiles, depth)
+    if frame is None:
+        return count
+
+    frames = [None] * (len(grid) * len(grid[0]) // 4 + 1)
+    frames[0] = frame
+    top = 0
+    while True:
+        remaining_tiles, i, solutions_count, depth = frame
+        if i == len(remaining_tiles):
+            if DEBUG:
+                print_indent('Total solutions: {}'.format(solutions_count), depth)
+            add_grid_to_cache(grid, solutions_count)
+            frames[top] = None
+            top -= 1
+            if top < 0:
+                return solutions_count
+
+            # Add the count into the parent, which placed the tile before the
+            # one it's about to try
+            frame = frames[top]
+            frame[2] += solutions_count
+            if DEBUG:
+                print_indent('Explored child, adding {}'.format(solutions_count), frame[3])
+            remove_tile_from_grid(grid, frame[0][frame[1] - 1])
+            continue
+
         tile = remaining_tiles[i]
+        frame[1] = i + 1
 
         add_tile_to_grid(grid, tile)
 
         cached_solution_count = get_cached_grid_solution_count(grid)
         if cached_solution_count is not None:
             cache_hits += 1
-            solutions_count += cached_solution_count
-            print_indent('Cache hit, adding {} for:'.format(cached_solution_count), depth)
-            print_grid(grid, depth + 1)
+            frame[2] += cached_solution_count
+            if DEBUG:
+                print_indent('Cache hit, adding {} for:'.format(cached_solution_count), depth)
+                print_grid(grid, depth + 1)
         elif can_solve_grid(grid):
-            solution_count_for_child = count_solutions_for_grid(grid, remaining_tiles[i:], depth + 1)
-            solutions_count += solution_count_for_child
-            print_indent('Explored child, adding {}'.format(solution_count_for_child), depth)
+            solution_count_for_child, child_frame = visit_grid(grid, remaining_tiles[i:], depth + 1)
+            if child_frame is not None:
+                top += 1
+                frames[top] = frame = child_frame
+                continue
+            frame[2] += solution_count_for_child
+            if DEBUG:
+                print_indent('Explored child, adding {}'.format(solution_count_for_child), depth)
         else:
             add_non_solvable_grid_to_cache(grid)
-            print_indent('No solution for child, so skipping:', depth)
-            print_grid(grid, depth + 1)
+            if DEBUG:
+                print_indent('No solution for child, so skipping:', depth)
+                print_grid(grid, depth + 1)
 
         remove_tile_from_grid(grid, tile)
 
-    print_indent('Total solutions: {}'.format(solutions_count), depth)
-    add_grid_to_cache(grid, solutions_count)
-    return solutions_count
-
-def print_stat(title, indent, measurements):
-    s = sum(measurements)
-    l = len(measurements)
-    print('{}{}: {} / {} = {}'.format(' ' * indent, title, s, l, s / l))
+def print_stat(title, indent, perf_stat):
+    s = perf_stat.total_seconds
+    l = perf_stat.count
+    print('{}{}: {} / {} = {}'.format(' ' * indent, title, s, l, s / l if l else 0))
 
 def brick_tiling(text_grid_representation):
     grid = []
@@ -349,6 +423,14 @@ def brick_tiling(text_grid_representation):
 
     placeable_tiles = generate_placeable_tiles_for_grid(grid)
 
+    for perf_stat in [
+        perf_deep_copy,
+        perf_find_first_free_space,
+        perf_get_contiguous_section,
+        perf_can_solve_contiguous_section
+    ]:
+        perf_stat.reset()
+
     perf_start = time.time()
     count = count_solutions_for_grid(grid, placeable_tiles, 0)
     perf_end = time.time()
@@ -366,7 +448,7 @@ def brick_tiling(text_grid_representation):
     # print('contig section cache hits: {}'.format(contig_section_cache_hits))
     # print('contig section cache size: {}'.format(len(contig_section_cache)))
 
-    return 0
+    return count
 
 height = 12
 width = 8
@@ -491,8 +573,9 @@ test_cases.append([
     #     '........'
     # ]
 
-for test_case in test_cases:
-    brick_tiling(test_case)
+if __name__ == '__main__':
+    for test_case in test_cases:
+        brick_tiling(test_case)
 
 
 # if __name__ == '__main__':
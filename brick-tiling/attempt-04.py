@@ -123,6 +123,8 @@ def generate_placeable_tiles_for_grid(grid):
                     generate_placeable_tiles_for_point(grid, row, col)
     return placeable_tiles
 
+NEIGHBOR_OFFSETS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+
 # Modifies grid
 def get_contiguous_section(grid, starting_point):
     row = starting_point[0]
@@ -133,16 +135,28 @@ def get_contiguous_section(grid, starting_point):
     if grid.is_space_occupied(row, col):
         raise Exception('Starting point already occupied')
 
+    # Depth-first over an explicit stack of (point, next neighbor to try)
+    # rather than recursing, so big sections don't hit the recursion limit.
+    # Points come out in the same order recursing would give.
     grid.mark_space_occupied(row, col)
     result = [starting_point]
-    if grid.is_space_free(row - 1, col):
-        result = result + get_contiguous_section(grid, (row - 1, col))
-    if grid.is_space_free(row + 1, col):
-        result = result + get_contiguous_section(grid, (row + 1, col))
-    if grid.is_space_free(row, col - 1):
-        result = result + get_contiguous_section(grid, (row, col - 1))
-    if grid.is_space_free(row, col + 1):
-        result = result + get_contiguous_section(grid, (row, col + 1))
+    stack = [None] * (grid.row_count * grid.col_count)
+    stack[0] = (starting_point, 0)
+    top = 0
+    while top >= 0:
+        point, neighbor_index = stack[top]
+        if neighbor_index == len(NEIGHBOR_OFFSETS):
+            top -= 1
+            continue
+        stack[top] = (point, neighbor_index + 1)
+
+        row = point[0] + NEIGHBOR_OFFSETS[neighbor_index][0]
+        col = point[1] + NEIGHBOR_OFFSETS[neighbor_index][1]
+        if grid.is_space_free(row, col):
+            grid.mark_space_occupied(row, col)
+            result.append((row, col))
+            top += 1
+            stack[top] = ((row, col), 0)
 
     return result
 
@@ -264,32 +278,50 @@ def can_solve_contiguous_section(contiguous_section):
     add_contig_section_to_cache(contiguous_section, True)
     return True
 
-perf_deep_copy = []
-perf_find_first_free_space = []
-perf_get_contiguous_section = []
-perf_can_solve_contiguous_section = []
+# Total time spent in something and how many times it was timed. Only the
+# running totals are kept, so timing doesn't grow memory with every call.
+class PerfStat:
+    total_ns = 0
+    count = 0
+
+    def reset(self):
+        self.total_ns = 0
+        self.count = 0
+
+    def record_since(self, start_ns):
+        self.total_ns += time.perf_counter_ns() - start_ns
+        self.count += 1
+
+    @property
+    def total_seconds(self):
+        return self.total_ns / 10 ** 9
+
+perf_deep_copy = PerfStat()
+perf_find_first_free_space = PerfStat()
+perf_get_contiguous_section = PerfStat()
+perf_can_solve_contiguous_section = PerfStat()
 def can_solve_grid(grid):
-    perf_start = time.time()
+    perf_start = time.perf_counter_ns()
     grid_copy = Grid(grid_to_copy=grid)
-    perf_deep_copy.append(time.time() - perf_start)
+    perf_deep_copy.record_since(perf_start)
 
-    perf_start = time.time()
+    perf_start = time.perf_counter_ns()
     free_space = el_find_first_free_space(grid_copy, (0, 0))
-    perf_find_first_free_space.append(time.time() - perf_start)
+    perf_find_first_free_space.record_since(perf_start)
     while free_space:
-        perf_start = time.time()
+        perf_start = time.perf_counter_ns()
         contiguous_section = get_contiguous_section(grid_copy, free_space)
-        perf_get_contiguous_section.append(time.time() - perf_start)
+        perf_get_contiguous_section.record_since(perf_start)
 
-        perf_start = time.time()
+        perf_start = time.perf_counter_ns()
         can_solve = can_solve_contiguous_section(contiguous_section)
-        perf_can_solve_contiguous_section.append(time.time() - perf_start)
+        perf_can_solve_contiguous_section.record_since(perf_start)
         if not can_solve:
             return False
 
-        perf_start = time.time()
+        perf_start = time.perf_counter_ns()
         free_space = el_find_first_free_space(grid_copy, free_space)
-        perf_find_first_free_space.append(time.time() - perf_start)
+        perf_find_first_free_space.record_since(perf_start)
 
     return True
 
@@ -330,33 +362,72 @@ def get_cached_grid_solution_count(grid):
 # perf_is_grid_solved = []
 el_solutions_evaluated = 0
 cache_hits = 0
-def count_solutions_for_grid(grid, remaining_tiles, depth):
+# Returns (count, None) if the grid's count is known right away, or else
+# (None, frame) with the frame for counting it. A frame is [tiles that can
+# still be placed, index of the next one to try, solutions so far, depth].
+def visit_grid(grid, remaining_tiles, depth):
     global el_solutions_evaluated
-    global cache_hits
 
     el_solutions_evaluated += 1
     debug_print('Exploring grid:', indent=depth)
     grid.print_rows(print_func=debug_print, indent=depth)
 
     if grid.are_all_spaces_occupied():
-        return 1
+        return 1, None
 
-    solutions_count = 0
     remaining_tiles = [tile for tile in remaining_tiles if can_place_tile_on_grid(grid, tile)]
-    for i in range(len(remaining_tiles)):
+    return None, [remaining_tiles, 0, 0, depth]
+
+# Depth-first over an explicit stack of frames rather than recursing, so deep
+# grids don't hit the recursion limit. Every frame below the top has placed
+# one tile, and a tile fills 4 spaces, so the stack is preallocated to that.
+# A frame's count is cached when it's popped.
+def count_solutions_for_grid(grid, remaining_tiles, depth):
+    global cache_hits
+
+    count, frame = visit_grid(grid, remaining_tiles, depth)
+    if frame is None:
+        return count
+
+    frames = [None] * (grid.row_count * grid.col_count // 4 + 1)
+    frames[0] = frame
+    top = 0
+    while True:
+        remaining_tiles, i, solutions_count, depth = frame
+        if i == len(remaining_tiles):
+            debug_print('Total solutions: {}'.format(solutions_count), depth)
+            add_grid_to_cache(grid, solutions_count)
+            frames[top] = None
+            top -= 1
+            if top < 0:
+                return solutions_count
+
+            # Add the count into the parent, which placed the tile before the
+            # one it's about to try
+            frame = frames[top]
+            frame[2] += solutions_count
+            debug_print('Explored child, adding {}'.format(solutions_count), frame[3])
+            grid.mark_spaces_free(frame[0][frame[1] - 1])
+            continue
+
         tile = remaining_tiles[i]
+        frame[1] = i + 1
 
         grid.mark_spaces_occupied(tile)
 
         cached_solution_count = get_cached_grid_solution_count(grid)
         if cached_solution_count is not None:
             cache_hits += 1
-            solutions_count += cached_solution_count
+            frame[2] += cached_solution_count
             debug_print('Cache hit, adding {} for:'.format(cached_solution_count), depth)
             grid.print_rows(print_func=debug_print, indent=depth + 1)
         elif can_solve_grid(grid):
-            solution_count_for_child = count_solutions_for_grid(grid, remaining_tiles[i:], depth + 1)
-            solutions_count += solution_count_for_child
+            solution_count_for_child, child_frame = visit_grid(grid, remaining_tiles[i:], depth + 1)
+            if child_frame is not None:
+                top += 1
+                frames[top] = frame = child_frame
+                continue
+            frame[2] += solution_count_for_child
             debug_print('Explored child, adding {}'.format(solution_count_for_child), depth)
         else:
             add_non_solvable_grid_to_cache(grid)
@@ -365,14 +436,10 @@ def count_solutions_for_grid(grid, remaining_tiles, depth):
 
         grid.mark_spaces_free(tile)
 
-    debug_print('Total solutions: {}'.format(solutions_count), depth)
-    add_grid_to_cache(grid, solutions_count)
-    return solutions_count
-
-def print_stat(title, indent, measurements):
-    s = sum(measurements)
-    l = len(measurements)
-    print('{}{}: {} / {} = {}'.format(' ' * indent, title, s, l, s / l))
+def print_stat(title, indent, perf_stat):
+    s = perf_stat.total_seconds
+    l = perf_stat.count
+    print('{}{}: {} / {} = {}'.format(' ' * indent, title, s, l, s / l if l else 0))
 
 def brick_tiling(text_grid_representation):
     grid = Grid(row_count=len(text_grid_representation), col_count=len(text_grid_representation[0]))
@@ -383,6 +450,14 @@ def brick_tiling(text_grid_representation):
 
     placeable_tiles = generate_placeable_tiles_for_grid(grid)
 
+    for perf_stat in [
+        perf_deep_copy,
+        perf_find_first_free_space,
+        perf_get_contiguous_section,
+        perf_can_solve_contiguous_section
+    ]:
+        perf_stat.reset()
+
     perf_start = time.time()
     count = count_solutions_for_grid(grid, placeable_tiles, 0)
     perf_end = time.time()
@@ -400,7 +475,7 @@ def brick_tiling(text_grid_representation):
     print('contig section cache hits: {}'.format(contig_section_cache_hits))
     print('contig section cache size: {}'.format(len(contig_section_cache)))
 
-    return 0
+    return count
 
 
 # test_data_row_count = 12
@@ -524,8 +599,9 @@ test_cases.append([
     #     '........'
     # ]
 
-for test_case in test_cases:
-    brick_tiling(test_case)
+if __name__ == '__main__':
+    for test_case in test_cases:
+        brick_tiling(test_case)
 
 
 # if __name__ == '__main__':
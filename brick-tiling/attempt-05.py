@@ -14,6 +14,7 @@ DEBUG = True
 # col_count
 # are_all_spaces_occupied()
 # are_spaces_free(spaces)
+# create_canonical_key()
 # flip_horz()
 # flip_vert()
 # is_col_fully_occupied(col)
@@ -77,6 +78,30 @@ class Grid:
                 return False
         return True
 
+    # The set of L tiles is closed under rotation and reflection, so every
+    # grid that's a rotated or reflected copy of another has the same solution
+    # count. They all share one key: the smallest of the transformed grids.
+    # The grid is cropped to its free spaces first, so fully occupied rows and
+    # cols around them don't change the key either.
+    def create_canonical_key(self):
+        free_rows = [row for row in range(self.row_count) if sum(self._grid[row]) > 0]
+        if not free_rows:
+            return '()'
+        free_cols = [col for col in range(self.col_count) if not self.is_col_fully_occupied(col)]
+        cropped = tuple(
+            tuple(self._grid[row][free_cols[0]:free_cols[-1] + 1])
+            for row in range(free_rows[0], free_rows[-1] + 1)
+        )
+        transposed = tuple(zip(*cropped))
+
+        # Each of the 8 symmetries of a square (4 rotations, each optionally
+        # mirrored)
+        candidates = []
+        for matrix in (cropped, transposed):
+            flipped_horz = tuple(row[::-1] for row in matrix)
+            candidates.extend([matrix, matrix[::-1], flipped_horz, flipped_horz[::-1]])
+        return str(min(candidates))
+
     def flip_horz(self):
         for row in self._grid:
             row.reverse()
@@ -217,28 +242,20 @@ def debug_print(text, indent=0):
 
 subsection_solution_cache = {}
 def set_cached_subsection_solution_count(subsection_grid, solutions_count):
-    subsection_solution_cache[str(subsection_grid)] = solutions_count
-
-    subsection_grid.flip_vert()
-    subsection_solution_cache[str(subsection_grid)] = solutions_count
-
-    subsection_grid.flip_horz()
-    subsection_solution_cache[str(subsection_grid)] = solutions_count
-
-    subsection_grid.flip_vert()
-    subsection_solution_cache[str(subsection_grid)] = solutions_count
-
-    # Restore to original
-    subsection_grid.flip_horz()
+    subsection_solution_cache[subsection_grid.create_canonical_key()] = solutions_count
 
 def get_cached_subsection_solution_count(subsection_grid):
-    key = str(subsection_grid)
+    key = subsection_grid.create_canonical_key()
     return subsection_solution_cache[key] if key in subsection_solution_cache else None
 
 # perf_is_grid_solved = []
 recursion_count = 0
 cache_hits = 0
-def count_solutions_for_grid(grid, tiles, depth):
+# Returns (count, None) if the grid's count is known right away, or else
+# (None, frame) with the frame for counting it. A frame is [grid, tiles,
+# subsection grids (None unless the grid splits into more than one), index
+# of the next tile or subsection to try, solutions so far, depth].
+def visit_grid(grid, tiles, depth):
     global recursion_count
     global cache_hits
 
@@ -247,33 +264,72 @@ def count_solutions_for_grid(grid, tiles, depth):
     subsection_solution_count = get_cached_subsection_solution_count(grid)
     if subsection_solution_count is not None:
         cache_hits += 1
-        return subsection_solution_count
+        return subsection_solution_count, None
 
     if grid.are_all_spaces_occupied():
         set_cached_subsection_solution_count(grid, 1)
-        return 1
+        return 1, None
 
-    solutions_count = 0
     subsection_grids = grid.get_subsection_grids()
     if len(subsection_grids) > 1:
-        solutions_count = 1
-        for subsection_grid in subsection_grids:
-            solutions_count *= count_solutions_for_grid(
-                subsection_grid,
-                create_tiles_normalized_to_offset(tiles, subsection_grid.subsection_offset),
-                depth + 1
-            )
-    else:
-        for i in range(len(tiles)):
-            tile = tiles[i]
-            if grid.are_spaces_free(tile):
-                child = Grid(grid_to_copy=grid)
-                child.mark_spaces_occupied(tile)
-                new_solutions = count_solutions_for_grid(child, tiles[i:], depth + 1)
-                solutions_count += new_solutions
-                # grid.mark_spaces_free(tile)
-
-    return solutions_count
+        return None, [grid, tiles, subsection_grids, 0, 1, depth]
+    return None, [grid, tiles, None, 0, 0, depth]
+
+# Depth-first over an explicit stack of frames rather than recursing, so deep
+# grids don't hit the recursion limit. Each placed tile adds at most two
+# frames (a split into subsections and then a choice within one), and a tile
+# fills 4 spaces, so the stack is preallocated to that.
+def count_solutions_for_grid(grid, tiles, depth):
+    count, frame = visit_grid(grid, tiles, depth)
+    if frame is None:
+        return count
+
+    frames = [None] * (2 * (grid.row_count * grid.col_count // 4) + 2)
+    frames[0] = frame
+    top = 0
+    while True:
+        grid, tiles, subsection_grids, i, solutions_count, depth = frame
+
+        # Find the frame's next child to count, if it has any left
+        child = None
+        if subsection_grids is not None:
+            if i < len(subsection_grids):
+                subsection_grid = subsection_grids[i]
+                child = (
+                    subsection_grid,
+                    create_tiles_normalized_to_offset(tiles, subsection_grid.subsection_offset)
+                )
+                frame[3] = i + 1
+        else:
+            while i < len(tiles):
+                tile = tiles[i]
+                i += 1
+                if grid.are_spaces_free(tile):
+                    child_grid = Grid(grid_to_copy=grid)
+                    child_grid.mark_spaces_occupied(tile)
+                    child = (child_grid, tiles[i - 1:])
+                    break
+            frame[3] = i
+
+        if child is None:
+            frames[top] = None
+            top -= 1
+            if top < 0:
+                return solutions_count
+            frame = frames[top]
+            count = solutions_count
+        else:
+            count, child_frame = visit_grid(child[0], child[1], depth + 1)
+            if child_frame is not None:
+                top += 1
+                frames[top] = frame = child_frame
+                continue
+
+        # Add the child's count into its parent
+        if frame[2] is not None:
+            frame[4] *= count
+        else:
+            frame[4] += count
 
 def print_stat(title, indent, measurements):
     s = sum(measurements)
@@ -298,7 +354,7 @@ def brick_tiling(text_grid_representation):
     print('cache size: {}'.format(len(subsection_solution_cache)))
     print('total time: {}'.format(perf_end - perf_start))
 
-    return 0
+    return count
 
 
 # test_data_row_count = 12
@@ -422,8 +478,9 @@ test_cases.append([
     #     '........'
     # ]
 
-for test_case in test_cases:
-    brick_tiling(test_case)
+if __name__ == '__main__':
+    for test_case in test_cases:
+        brick_tiling(test_case)
 
 
 # if __name__ == '__main__':
@@ -86,19 +86,41 @@ def partial_solution_to_bitmap(partial_solution):
             bm |= 1 << i
     return bm
 
-perf_create_cache_key = []
+# Total time spent in something and how many times it was timed. Only the
+# running totals are kept, so timing doesn't grow memory with every call.
+class PerfStat:
+    total_ns = 0
+    count = 0
+
+    def reset(self):
+        self.total_ns = 0
+        self.count = 0
+
+    def record_since(self, start_ns):
+        self.total_ns += time.perf_counter_ns() - start_ns
+        self.count += 1
+
+    @property
+    def total_seconds(self):
+        return self.total_ns / 10 ** 9
+
+perf_create_cache_key = PerfStat()
 def create_cache_key_for_partial_solution_set(partial_solutions):
-    start = time.time()
+    perf_start = time.perf_counter_ns()
     bitmap_strs = [str(partial_solution_to_bitmap(pm)) for pm in partial_solutions]
     bitmap_strs.sort()
     result = '.'.join(bitmap_strs)
-    perf_create_cache_key.append(time.time() - start)
+    perf_create_cache_key.record_since(perf_start)
     return result
 
 result_cache = {}
 cache_hits = 0
 recursion_count = 0
-def count_solutions(partial_solutions):
+# Returns (count, None) if the count is known right away, or else (None,
+# frame) with the frame for counting it. A frame is [partial solutions, the
+# ones covering the least covered point, index of the next of those to try,
+# solutions so far, cache key].
+def visit_partial_solutions(partial_solutions):
     points_to_fill_count = len(partial_solutions[0])
 
     global recursion_count
@@ -108,7 +130,7 @@ def count_solutions(partial_solutions):
     cache_key = create_cache_key_for_partial_solution_set(partial_solutions)
     if cache_key in result_cache:
         cache_hits += 1
-        return result_cache[cache_key]
+        return result_cache[cache_key], None
 
     # How many partial solutions cover a given point
     point_coverage_counts = [
@@ -121,7 +143,7 @@ def count_solutions(partial_solutions):
         # Some points aren't covered by any of the remaining partial solutions,
         # so there aren't any solutions with the partials selected thus far
         result_cache[cache_key] = 0
-        return 0
+        return 0, None
 
     # Select a point with minimal coverage
     index_of_min_covered_point = next(
@@ -129,45 +151,81 @@ def count_solutions(partial_solutions):
         if point_coverage_counts[i] == min_point_coverage
     )
 
-    solutions_count = 0
     partial_solutions_with_min_covered_point = [
         ps for ps in partial_solutions
         if ps[index_of_min_covered_point] == 1
     ]
-    for selected_ps in partial_solutions_with_min_covered_point:
-        indexes_of_points_covered_by_selected_ps = [
-            i for i in range(points_to_fill_count)
-            if selected_ps[i] == 1
-        ]
-
-        if len(indexes_of_points_covered_by_selected_ps) == points_to_fill_count:
-            # This partial solution fills all the remaining points needing to be
-            # filled, so we've found a solution
+    return None, [partial_solutions, partial_solutions_with_min_covered_point, 0, 0, cache_key]
 
-            # TODO: How to set cache here?
-
-            solutions_count += 1
-            continue
-
-        # Remove partial solutions that overlap with the selected partial solution and
-        # from each of those, remove the points covered by the selected partial solution.
-        reduced_partial_solutions = [
-            [ps[i] for i in range(len(ps)) if i not in indexes_of_points_covered_by_selected_ps]
-            for ps in partial_solutions # TODO: Exclude the ones already looked at in this loop
-            if not do_partial_solutions_conflict(ps, selected_ps)
-        ]
-
-        if not reduced_partial_solutions:
-            # We still have unfilled points, but no more partial solutions to
-            # select, so there aren't any solutions with this set of selections
+# Depth-first over an explicit stack of frames rather than recursing, so deep
+# grids don't hit the recursion limit. Every frame below the top has selected
+# one partial solution, which fills 4 points, so the stack is preallocated to
+# that. A frame's count is cached when it's popped.
+def count_solutions(partial_solutions):
+    count, frame = visit_partial_solutions(partial_solutions)
+    if frame is None:
+        return count
+
+    frames = [None] * (len(partial_solutions[0]) // 4 + 1)
+    frames[0] = frame
+    top = 0
+    while True:
+        partial_solutions, partial_solutions_with_min_covered_point, next_index, solutions_count, cache_key = frame
+        points_to_fill_count = len(partial_solutions[0])
+
+        child_frame = None
+        while next_index < len(partial_solutions_with_min_covered_point):
+            selected_ps = partial_solutions_with_min_covered_point[next_index]
+            next_index += 1
+            indexes_of_points_covered_by_selected_ps = [
+                i for i in range(points_to_fill_count)
+                if selected_ps[i] == 1
+            ]
+
+            if len(indexes_of_points_covered_by_selected_ps) == points_to_fill_count:
+                # This partial solution fills all the remaining points needing to be
+                # filled, so we've found a solution
+
+                # TODO: How to set cache here?
+
+                solutions_count += 1
+                continue
+
+            # Remove partial solutions that overlap with the selected partial solution and
+            # from each of those, remove the points covered by the selected partial solution.
+            reduced_partial_solutions = [
+                [ps[i] for i in range(len(ps)) if i not in indexes_of_points_covered_by_selected_ps]
+                for ps in partial_solutions # TODO: Exclude the ones already looked at in this loop
+                if not do_partial_solutions_conflict(ps, selected_ps)
+            ]
+
+            if not reduced_partial_solutions:
+                # We still have unfilled points, but no more partial solutions to
+                # select, so there aren't any solutions with this set of selections
+                continue
+
+            count, child_frame = visit_partial_solutions(reduced_partial_solutions)
+            if child_frame is not None:
+                break
+            solutions_count += count
+        frame[2] = next_index
+        frame[3] = solutions_count
+
+        if child_frame is not None:
+            top += 1
+            frames[top] = frame = child_frame
             continue
 
-        solutions_count += count_solutions(reduced_partial_solutions)
-
-    result_cache[cache_key] = solutions_count
-    return solutions_count
+        result_cache[cache_key] = solutions_count
+        frames[top] = None
+        top -= 1
+        if top < 0:
+            return solutions_count
+        frame = frames[top]
+        frame[3] += solutions_count
 
 def brick_tiling(grid):
+    perf_create_cache_key.reset()
     perf_start = time.time()
 
     grid_row_count = len(grid)
@@ -202,7 +260,7 @@ def brick_tiling(grid):
     debug_print('Time: {}'.format(perf_end - perf_start))
     debug_print('Recursion count: {}'.format(recursion_count))
     debug_print('Cache hits: {}'.format(cache_hits))
-    debug_print('Create cache key time: {}'.format(sum(perf_create_cache_key)))
+    debug_print('Create cache key time: {}'.format(perf_create_cache_key.total_seconds))
 
     return count
 
@@ -370,8 +428,9 @@ test_cases.append([
 #     '........'
 # ])
 
-for test_case in test_cases:
-    brick_tiling(test_case)
+if __name__ == '__main__':
+    for test_case in test_cases:
+        brick_tiling(test_case)
 
 
 # if __name__ == '__main__':
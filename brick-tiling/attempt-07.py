@@ -1,7 +1,16 @@
 #!/bin/python3
 
+import argparse
+import bisect
+import hashlib
+import json
+import multiprocessing
 import os
+import random
+import sqlite3
+import sys
 import time
+from collections import OrderedDict
 
 DEBUG = True
 
@@ -9,6 +18,213 @@ def debug_print(text, indent=0):
     if DEBUG:
         print('{}{}'.format(' ' * (2 * indent), text))
 
+# Latency histogram over a fixed set of bucket bounds, in nanoseconds.
+# Bucket i counts samples up to bounds[i], and the last bucket counts
+# everything above the largest bound, so the memory used doesn't depend on
+# how many samples are recorded.
+HISTOGRAM_BOUNDS_NS = [1000 * 2 ** i for i in range(24)]
+class Histogram:
+    bounds = None
+    bucket_counts = None
+    count = None
+    total = None
+    min = None
+    max = None
+
+    def __init__(self, bounds=HISTOGRAM_BOUNDS_NS):
+        self.bounds = bounds
+        self.bucket_counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        self.bucket_counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    # Upper bound of the bucket holding the given quantile, or the max for
+    # the overflow bucket
+    def get_quantile(self, quantile):
+        if self.count == 0:
+            return None
+        rank = quantile * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.bucket_counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count > 0:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self):
+        buckets = {}
+        for i, bucket_count in enumerate(self.bucket_counts):
+            if bucket_count > 0:
+                label = 'le_{}'.format(self.bounds[i]) if i < len(self.bounds) else 'inf'
+                buckets[label] = bucket_count
+        return {
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.get_quantile(0.5),
+            'p95': self.get_quantile(0.95),
+            'p99': self.get_quantile(0.99),
+            'buckets': buckets,
+        }
+
+class MetricTimer:
+    metrics = None
+    name = None
+    start = None
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.record(self.name, time.perf_counter_ns() - self.start)
+        return False
+
+# Stands in for a MetricTimer on the uses a sampled timer skips
+class SkippedMetricTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+SKIPPED_METRIC_TIMER = SkippedMetricTimer()
+
+# Named counters and latency histograms. The registry is reset at the start
+# of each brick_tiling call, so a snapshot describes the most recent solve.
+class Metrics:
+    counters = None
+    histograms = None
+    timer_use_counts = None
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.timer_use_counts = {}
+
+    def reset(self):
+        self.counters = {}
+        self.histograms = {}
+        self.timer_use_counts = {}
+
+    def increment(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record(self, name, value_ns):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.record(value_ns)
+
+    # Times only every sample_interval-th use of the named timer, so work done
+    # at every node of a search can be timed without reading the clock and
+    # updating a histogram at each one
+    def timer(self, name, sample_interval=1):
+        use_count = self.timer_use_counts.get(name, 0)
+        self.timer_use_counts[name] = use_count + 1
+        if use_count % sample_interval != 0:
+            return SKIPPED_METRIC_TIMER
+        return MetricTimer(self, name)
+
+    def snapshot(self):
+        return {
+            'counters': dict(self.counters),
+            'histograms': {
+                name: histogram.snapshot()
+                for name, histogram in self.histograms.items()
+            },
+        }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), sort_keys=True)
+
+metrics = Metrics()
+
+# Hooks called by the engines as they walk the search tree. A node is
+# identified by whatever the engine memoizes it under: the filled bitmap for
+# the bitboard and dancing links engines and the cache key for exact cover.
+# The engines only call these when a tracer is installed with set_tracer, so
+# an untraced search pays for a single None check per node.
+class SearchTracer:
+    def on_enter_node(self, engine, node, depth):
+        pass
+
+    def on_cache_hit(self, engine, node, depth, count):
+        pass
+
+    def on_prune(self, engine, node, depth, reason):
+        pass
+
+    def on_solution(self, engine, node, depth):
+        pass
+
+    def close(self):
+        pass
+
+# Writes one compact JSON array per event, e.g. ["enter","bitboard",12,3].
+# Bitmaps are written as plain integers. read_trace replays the events.
+class JsonlTracer(SearchTracer):
+    output_stream = None
+
+    def __init__(self, output_stream):
+        self.output_stream = output_stream
+
+    def _write(self, event):
+        self.output_stream.write(json.dumps(event, separators=(',', ':')))
+        self.output_stream.write('\n')
+
+    def on_enter_node(self, engine, node, depth):
+        self._write(['enter', engine, node, depth])
+
+    def on_cache_hit(self, engine, node, depth, count):
+        self._write(['cache_hit', engine, node, depth, count])
+
+    def on_prune(self, engine, node, depth, reason):
+        self._write(['prune', engine, node, depth, reason])
+
+    def on_solution(self, engine, node, depth):
+        self._write(['solution', engine, node, depth])
+
+    def close(self):
+        self.output_stream.flush()
+
+def read_trace(input_stream):
+    for line in input_stream:
+        if line.strip():
+            yield json.loads(line)
+
+def replay_trace(input_stream, tracer):
+    handlers = {
+        'enter': tracer.on_enter_node,
+        'cache_hit': tracer.on_cache_hit,
+        'prune': tracer.on_prune,
+        'solution': tracer.on_solution,
+    }
+    for event in read_trace(input_stream):
+        handlers[event[0]](*event[1:])
+
+tracer = None
+def set_tracer(new_tracer):
+    global tracer
+    previous_tracer = tracer
+    tracer = new_tracer
+    return previous_tracer
+
 # At a high level, the problem is approached as follows:
 # 1. Flatten the problem grid into a single-dimensional array, such that
 #    each space in the array represents a point on the grid.
@@ -21,87 +237,92 @@ def debug_print(text, indent=0):
 #    with no conflicts. That is, a valid solution is one in which any column
 #    in the selected set sums to exactly 1.
 
+TILE_SIZE = 4
+
+# HackerRank asks for counts modulo this. Anything that takes a mod counts
+# exactly (with unbounded ints) when it's None.
+MOD = 10 ** 9 + 7
+
+def get_points_in_bitmap(bitmap):
+    points = []
+    while bitmap:
+        low_bit = bitmap & -bitmap
+        points.append(low_bit.bit_length() - 1)
+        bitmap ^= low_bit
+    return points
+
+# A set of tile points as a bitmap over the flattened grid. Instances only
+# hold the bitmap and can't be changed once created: which points are still
+# to be filled is kept by the PartialSolutionSet a partial solution belongs
+# to, and the occupied points are derived from the bitmap when asked for.
 class PartialSolution:
-    _bitarray = None
-    _bitmap = None
-    _occupied_points = None
+    __slots__ = ('_bitmap',)
 
-    def __init__(self, num_points, occupied_points):
-        self._bitarray = [0] * num_points
-        self._bitmap = 0
-        self._occupied_points = sorted(occupied_points)
+    def __init__(self, bitmap):
+        object.__setattr__(self, '_bitmap', bitmap)
 
-        for point in self._occupied_points:
-            self._bitarray[point] = 1
-            self._bitmap |= 1 << point
+    def __setattr__(self, name, value):
+        raise AttributeError('PartialSolution is immutable')
 
     def __getitem__(self, index):
-        return 1 if self._bitmap & (1 << index) else 0
-        # return self._bitarray[index]
+        return (self._bitmap >> index) & 1
+
+    @classmethod
+    def create_from_points(cls, occupied_points):
+        bitmap = 0
+        for point in occupied_points:
+            bitmap |= 1 << point
+        return cls(bitmap)
 
     @classmethod
     def create_from_grid(cls, grid, occupied_grid_points):
-        row_count = len(grid)
         col_count = len(grid[0])
-        occupied_flat_points = [
+        return cls.create_from_points(
             (grid_point[0] * col_count) + grid_point[1]
             for grid_point in occupied_grid_points
-        ]
-        return cls(row_count * col_count, occupied_flat_points)
+        )
 
     @property
     def uid(self):
         return self._bitmap
 
-    @property
-    def num_points(self):
-        return len(self._bitarray)
-
     @property
     def occupied_points(self):
-        return self._occupied_points
-
-    def create_copy(self, exclude_points=[]):
-        filtered = [
-            self._bitarray[i] for i in range(len(self._bitarray))
-            if i not in exclude_points
-        ]
-        return PartialSolution(
-            len(filtered),
-            [i for i in range(len(filtered)) if filtered[i] == 1]
-        )
+        return get_points_in_bitmap(self._bitmap)
 
     def has_overlap(self, other):
-        # print('has_overlap')
-        # print('{:b}'.format(self._bitmap).rjust(len(self._bitarray), '0'))
-        # print('{:b}'.format(other._bitmap).rjust(len(self._bitarray), '0'))
-        # print()
         return self._bitmap & other._bitmap != 0
-        # for i in range(len(self._bitarray)):
-        #     if self._bitarray[i] == 1 and other._bitarray[i] == 1:
-        #         return True
-        # return False
-
-    # def remove_points(self, points_to_exclude):
-    #     # TODO: for bitmap
-    #     self._bitarray = [
-    #         self._bitarray[point] for point in range(len(self._bitarray))
-    #         if point not in points_to_exclude
-    #     ]
-    #     for point in self._occupied_points:
-    #         self._bitarray[point] = 1
-    #         self._bitmap |= 1 << point
 
     def __str__(self):
-        return str(self._bitarray)
+        return str(self.occupied_points)
 
+# The partial solutions of an exact cover problem on a grid with col_count
+# columns. Points keep their place in the flattened grid and the set has a
+# bitmap of the points still to be filled, so narrowing the problem down
+# only means dropping partial solutions and updating the bitmap. The set
+# holds exactly the tiles that fit within the remaining points.
+class PartialSolutionSet(list):
+    __slots__ = ('remaining_bitmap', 'col_count')
 
-def generate_partial_solutions_for_grid_point(grid, grid_point):
+    def __init__(self, remaining_bitmap, col_count, partial_solutions=()):
+        list.__init__(self, partial_solutions)
+        self.remaining_bitmap = remaining_bitmap
+        self.col_count = col_count
+
+    @property
+    def num_points(self):
+        return bin(self.remaining_bitmap).count('1')
+
+    @property
+    def remaining_points(self):
+        return get_points_in_bitmap(self.remaining_bitmap)
+
+def generate_tiles_for_grid_point(grid_point):
     # Generate all L shapes for a given (row, col) point.
     # The approach here is to always have the target point, (row, col), be the elbow of the L.
     row = grid_point[0]
     col = grid_point[1]
-    tiles = [
+    return [
         # "Sideways" L's
         ((row + 1, col), (row, col), (row, col + 1), (row, col + 2)),
         ((row - 1, col), (row, col), (row, col - 1), (row, col - 2)),
@@ -114,6 +335,9 @@ def generate_partial_solutions_for_grid_point(grid, grid_point):
         ((row, col - 1), (row, col), (row - 1, col), (row - 2, col))
     ]
 
+def generate_partial_solutions_for_grid_point(grid, grid_point):
+    tiles = generate_tiles_for_grid_point(grid_point)
+
     grid_row_count = len(grid)
     grid_col_count = len(grid[0])
     def is_in_bounds(tile):
@@ -130,91 +354,775 @@ def generate_partial_solutions_for_grid_point(grid, grid_point):
         if is_in_bounds(tile)
     ]
 
-perf_create_cache_key = []
-def create_cache_key_for_partial_solution_set(partial_solutions):
-    start = time.time()
-    uids = [str(pm.uid) for pm in partial_solutions]
-    uids.sort()
-    result = '.'.join(uids)
-    perf_create_cache_key.append(time.time() - start)
-    return result
-
-result_cache = {}
-cache_hits = 0
-recursion_count = 0
-def count_solutions(partial_solutions):
-    points_to_fill_count = partial_solutions[0].num_points
-
-    global recursion_count
-    recursion_count += 1
-
-    global cache_hits
-    cache_key = create_cache_key_for_partial_solution_set(partial_solutions)
-    if cache_key in result_cache:
-        cache_hits += 1
-        return result_cache[cache_key]
-
-    # How many partial solutions cover a given point
-    point_coverage_counts = [
-        sum([ps[point] for ps in partial_solutions])
-        for point in range(points_to_fill_count)
+# Since a set holds exactly the tiles that fit within its remaining points,
+# those points and the grid width determine the problem. The points are
+# moved up to the first row and left to the first column, so the same shape
+# anywhere in the grid (or on a taller grid of the same width) shares the
+# entry. Only one in every CACHE_KEY_TIMER_SAMPLE_INTERVAL keys is timed,
+# since a key is made at every node of the search.
+CACHE_KEY_TIMER_SAMPLE_INTERVAL = 64
+def create_cache_key_for_partial_solution_set(partial_solutions, mod=None):
+    with metrics.timer('exact_cover.create_cache_key_ns', CACHE_KEY_TIMER_SAMPLE_INTERVAL):
+        remaining_bitmap = partial_solutions.remaining_bitmap
+        col_count = partial_solutions.col_count
+        first_point = (remaining_bitmap & -remaining_bitmap).bit_length() - 1
+        shifted_bitmap = remaining_bitmap >> ((first_point // col_count) * col_count) if remaining_bitmap else 0
+
+        # The columns that have any points, folded into a single row
+        row_mask = (1 << col_count) - 1
+        occupied_cols = 0
+        rows_bitmap = shifted_bitmap
+        while rows_bitmap:
+            occupied_cols |= rows_bitmap & row_mask
+            rows_bitmap >>= col_count
+        if occupied_cols:
+            # Every point is at least this many columns in, so shifting right
+            # by it moves each point within its own row
+            shifted_bitmap >>= (occupied_cols & -occupied_cols).bit_length() - 1
+
+        # The separator differs from the one in the keys of earlier versions,
+        # which a persistent result store may still hold
+        result = '{}/{:x}'.format(col_count, shifted_bitmap)
+        if mod is not None:
+            # Counts modulo something are kept apart from exact ones
+            result = '{}%{}'.format(result, mod)
+        return result
+
+# A memo of solution counts with an optional budget on the number of entries
+# and/or their approximate size in bytes. Once over budget, entries are
+# evicted according to the policy:
+#   'lru' - least recently used first
+#   'lfu' - least frequently used first (least recently used among ties)
+#   'depth' - deepest in the search first, since those are the smallest
+#       sub-problems and the cheapest to recompute
+#
+# If a store is given (see PersistentResultStore), misses fall through to it
+# and every new entry is written to it, so evicted entries aren't lost.
+#
+# Entries are kept in buckets by eviction priority, with the entry to evict
+# next at the front of the lowest priority bucket.
+class ResultCache:
+    EVICTION_POLICIES = ['lru', 'lfu', 'depth']
+    # What an entry costs beyond its key and value: the [value, priority,
+    # size] list and the slots and nodes it takes in the entries dict and its
+    # priority bucket, with the free space those hash tables keep around as
+    # entries are evicted. Measured with tracemalloc on CPython 3.11 under
+    # steady eviction, where it peaks a little over 400 bytes.
+    ENTRY_OVERHEAD_BYTES = 420
+
+    _max_entries = None
+    _max_bytes = None
+    _eviction_policy = None
+    _entries = None
+    _buckets = None
+    _byte_count = 0
+    _store = None
+    hits = 0
+    store_hits = 0
+    misses = 0
+    evictions = 0
+
+    def __init__(self, max_entries=None, max_bytes=None, eviction_policy='lru', store=None):
+        if eviction_policy not in self.EVICTION_POLICIES:
+            raise Exception('Unknown eviction policy: {}'.format(eviction_policy))
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._eviction_policy = eviction_policy
+        self._store = store
+        self.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def byte_count(self):
+        return self._byte_count
+
+    @property
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self._byte_count,
+            'hits': self.hits,
+            'store_hits': self.store_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def clear(self):
+        # Maps key to [value, priority, size]
+        self._entries = {}
+        self._buckets = {}
+        self._byte_count = 0
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def flush(self):
+        if self._store is not None:
+            self._store.flush()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            value = self._store.get(key) if self._store is not None else None
+            if value is None:
+                self.misses += 1
+                return None
+            self.store_hits += 1
+            self._add(key, value, 0)
+            return value
+
+        self.hits += 1
+        bucket = self._buckets[entry[1]]
+        if self._eviction_policy == 'lfu':
+            del bucket[key]
+            if not bucket:
+                del self._buckets[entry[1]]
+            entry[1] += 1
+            self._buckets.setdefault(entry[1], OrderedDict())[key] = None
+        else:
+            bucket.move_to_end(key)
+        return entry[0]
+
+    def set(self, key, value, depth=0):
+        if self._store is not None:
+            self._store.set(key, value)
+        self._add(key, value, depth)
+
+    def _add(self, key, value, depth):
+        if key in self._entries:
+            self._remove(key)
+
+        if self._eviction_policy == 'lfu':
+            priority = 1
+        elif self._eviction_policy == 'depth':
+            priority = -depth
+        else:
+            priority = 0
+        size = sys.getsizeof(key) + sys.getsizeof(value) + self.ENTRY_OVERHEAD_BYTES
+
+        self._entries[key] = [value, priority, size]
+        self._buckets.setdefault(priority, OrderedDict())[key] = None
+        self._byte_count += size
+
+        while self._is_over_budget() and len(self._entries) > 1:
+            lowest_priority = min(self._buckets)
+            evicted_key = next(iter(self._buckets[lowest_priority]))
+            self._remove(evicted_key)
+            self.evictions += 1
+
+    def _is_over_budget(self):
+        return (
+            (self._max_entries is not None and len(self._entries) > self._max_entries) or
+            (self._max_bytes is not None and self._byte_count > self._max_bytes)
+        )
+
+    def _remove(self, key):
+        value, priority, size = self._entries.pop(key)
+        bucket = self._buckets[priority]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[priority]
+        self._byte_count -= size
+
+# Solution counts kept in an SQLite file so that sub-problems solved by one
+# run can be looked up by later ones. The database is in WAL mode, so several
+# local worker processes can read it while one of them writes. Nothing is
+# opened until the first lookup, and a process that was forked from the one
+# that opened it gets its own connection.
+#
+# Keys are stored as a digest of the cache key, since cache keys for large
+# grids run to several KB. Counts are stored as text since they outgrow
+# SQLite's 64-bit integers.
+class PersistentResultStore:
+    COMMIT_INTERVAL = 1000
+
+    _path = None
+    _connection = None
+    _connection_pid = None
+    _pending_write_count = 0
+
+    def __init__(self, path):
+        self._path = path
+
+    def _get_connection(self):
+        if self._connection is None or self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self._path, timeout=30)
+            self._connection_pid = os.getpid()
+            self._pending_write_count = 0
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS result (key BLOB PRIMARY KEY, count TEXT NOT NULL)'
+            )
+            self._connection.commit()
+        return self._connection
+
+    def _digest(self, key):
+        return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+    def get(self, key):
+        row = self._get_connection().execute(
+            'SELECT count FROM result WHERE key = ?', (self._digest(key),)
+        ).fetchone()
+        return int(row[0]) if row is not None else None
+
+    def set(self, key, value):
+        self._get_connection().execute(
+            'INSERT OR IGNORE INTO result (key, count) VALUES (?, ?)',
+            (self._digest(key), str(value))
+        )
+        self._pending_write_count += 1
+        if self._pending_write_count >= self.COMMIT_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        if self._connection is not None and self._connection_pid == os.getpid():
+            self._connection.commit()
+            self._pending_write_count = 0
+
+    def close(self):
+        self.flush()
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+# Union-find that can roll back to an earlier state. Unions are by size with
+# no path compression, so each one changes exactly one parent and can be
+# undone in O(1), and finds stay O(log n).
+class UndoableUnionFind:
+    _parents = None
+    _sizes = None
+    _history = None
+    component_count = 0
+
+    def __init__(self, node_count):
+        self._parents = list(range(node_count))
+        self._sizes = [1] * node_count
+        self._history = []
+        self.component_count = 0
+
+    def find(self, node):
+        while self._parents[node] != node:
+            node = self._parents[node]
+        return node
+
+    def add(self, node):
+        # Nodes only count as components once they've been added
+        self._history.append(None)
+        self.component_count += 1
+
+    # Returns the root of the merged component
+    def union(self, node1, node2):
+        root1 = self.find(node1)
+        root2 = self.find(node2)
+        if root1 == root2:
+            return root1
+        if self._sizes[root1] < self._sizes[root2]:
+            root1, root2 = root2, root1
+        self._parents[root2] = root1
+        self._sizes[root1] += self._sizes[root2]
+        self._history.append(root2)
+        self.component_count -= 1
+        return root1
+
+    def checkpoint(self):
+        return len(self._history)
+
+    def rollback(self, checkpoint):
+        while len(self._history) > checkpoint:
+            child_root = self._history.pop()
+            if child_root is None:
+                self.component_count -= 1
+                continue
+            root = self._parents[child_root]
+            self._parents[child_root] = child_root
+            self._sizes[root] -= self._sizes[child_root]
+            self.component_count += 1
+
+# For each point of a grid of the given size, a bitmap of its neighbors, the
+# bitmaps of the 2x2 squares it's in, and the points (or the outside node,
+# numbered after the last point) around it including diagonally. Built once
+# per grid size.
+free_region_tables = {}
+def get_free_region_tables(row_count, col_count):
+    key = (row_count, col_count)
+    if key in free_region_tables:
+        return free_region_tables[key]
+
+    outside_node = row_count * col_count
+    neighbor_bitmaps = []
+    square_bitmaps = []
+    surrounding_nodes = []
+    for point in range(row_count * col_count):
+        row = point // col_count
+        col = point % col_count
+        neighbor_bitmap = 0
+        nodes = set()
+        for row_offset in (-1, 0, 1):
+            for col_offset in (-1, 0, 1):
+                neighbor_row = row + row_offset
+                neighbor_col = col + col_offset
+                is_in_bounds = (
+                    0 <= neighbor_row < row_count and
+                    0 <= neighbor_col < col_count
+                )
+                if not is_in_bounds:
+                    nodes.add(outside_node)
+                elif row_offset != 0 or col_offset != 0:
+                    neighbor = neighbor_row * col_count + neighbor_col
+                    nodes.add(neighbor)
+                    if row_offset == 0 or col_offset == 0:
+                        neighbor_bitmap |= 1 << neighbor
+        neighbor_bitmaps.append(neighbor_bitmap)
+        surrounding_nodes.append(sorted(nodes))
+
+        point_square_bitmaps = []
+        for square_row in (row - 1, row):
+            for square_col in (col - 1, col):
+                if 0 <= square_row < row_count - 1 and 0 <= square_col < col_count - 1:
+                    top_left = square_row * col_count + square_col
+                    point_square_bitmaps.append((0b11 | 0b11 << col_count) << top_left)
+        square_bitmaps.append(point_square_bitmaps)
+
+    free_region_tables[key] = (neighbor_bitmaps, square_bitmaps, surrounding_nodes)
+    return free_region_tables[key]
+
+# Keeps count of the connected regions of free points as tiles are placed
+# and removed during a search, without flood filling. The exact cover search
+# uses it to tell when a set can't have split into components.
+#
+# Union-find can't split components, but it can roll them back, so it tracks
+# the filled points instead: they only ever get added going down the search
+# and removed coming back up. The filled points (joined across diagonals too)
+# plus everything outside the grid form the complement of the free points,
+# and each of its components other than the one touching the outside is a
+# hole in the free points. The Euler number of the free points, which is
+# regions minus holes, is points - adjacent pairs + free 2x2 squares, and
+# each of those changes by a bounded amount per point filled. So:
+#
+# regions = (points - adjacent pairs + 2x2 squares) + (complement components - 1)
+class FreeRegionTracker:
+    _free_bitmap = None
+    _union_find = None
+    # See get_free_region_tables
+    _neighbor_bitmaps = None
+    _square_bitmaps = None
+    _surrounding_nodes = None
+    _euler_number = 0
+    _history = None
+    _pending_tile_masks = None
+
+    def __init__(self, row_count, col_count, filled_bitmap):
+        point_count = row_count * col_count
+        self._neighbor_bitmaps, self._square_bitmaps, self._surrounding_nodes = (
+            get_free_region_tables(row_count, col_count)
+        )
+
+        # Every point starts out free, which is one region with no holes. The
+        # outside node's bit is never set in the free bitmap, so it's taken
+        # as filled like any other.
+        self._free_bitmap = (1 << point_count) - 1
+        self._euler_number = 1 if point_count else 0
+        self._union_find = UndoableUnionFind(point_count + 1)
+        self._union_find.add(point_count)
+        self._history = []
+        self._pending_tile_masks = []
+
+        for point in range(point_count):
+            if filled_bitmap & (1 << point):
+                self._fill_point(point)
+
+    @property
+    def free_region_count(self):
+        if self._pending_tile_masks:
+            self._fill_pending_tiles()
+        return self._euler_number + self._union_find.component_count - 1
+
+    def _fill_point(self, point):
+        free_bitmap = self._free_bitmap
+        # The point and its edges to free neighbors go, and so does every
+        # free 2x2 square it was in
+        self._euler_number += bin(free_bitmap & self._neighbor_bitmaps[point]).count('1') - 1
+        for square_bitmap in self._square_bitmaps[point]:
+            if free_bitmap & square_bitmap == square_bitmap:
+                self._euler_number -= 1
+
+        free_bitmap ^= 1 << point
+        self._free_bitmap = free_bitmap
+        union_find = self._union_find
+        union_find.add(point)
+        root = point
+        for node in self._surrounding_nodes[point]:
+            if not free_bitmap >> node & 1:
+                root = union_find.union(root, node)
+
+    # Tiles are only filled in once the region count is asked for, since a
+    # search often backs out of a tile (on a memo hit, say) before it would.
+    # The pending tiles are always the latest ones, so they're filled in
+    # order and unfilled from the end.
+    def fill(self, tile_mask):
+        self._pending_tile_masks.append(tile_mask)
+
+    def unfill(self):
+        if self._pending_tile_masks:
+            self._pending_tile_masks.pop()
+            return
+        checkpoint, self._free_bitmap, self._euler_number = self._history.pop()
+        self._union_find.rollback(checkpoint)
+
+    def _fill_pending_tiles(self):
+        for tile_mask in self._pending_tile_masks:
+            self._history.append((
+                self._union_find.checkpoint(), self._free_bitmap, self._euler_number
+            ))
+            while tile_mask:
+                point_bit = tile_mask & -tile_mask
+                self._fill_point(point_bit.bit_length() - 1)
+                tile_mask ^= point_bit
+        self._pending_tile_masks.clear()
+
+# Splits a set of partial solutions into independent sets. Two points end up
+# in the same component only if a chain of overlapping partial solutions
+# connects them, so each component is an exact cover problem of its own.
+# Returns None if some point isn't covered by any partial solution.
+def split_partial_solutions_into_components(partial_solutions):
+
+    component_bitmaps = []
+    for ps in partial_solutions:
+        merged_bitmap = ps.uid
+        unmerged_bitmaps = []
+        for component_bitmap in component_bitmaps:
+            if component_bitmap & ps.uid:
+                merged_bitmap |= component_bitmap
+            else:
+                unmerged_bitmaps.append(component_bitmap)
+        unmerged_bitmaps.append(merged_bitmap)
+        component_bitmaps = unmerged_bitmaps
+
+    covered_bitmap = 0
+    for component_bitmap in component_bitmaps:
+        covered_bitmap |= component_bitmap
+    if covered_bitmap != partial_solutions.remaining_bitmap:
+        return None
+
+    if len(component_bitmaps) == 1:
+        return [partial_solutions]
+
+    return [
+        PartialSolutionSet(
+            component_bitmap,
+            partial_solutions.col_count,
+            [ps for ps in partial_solutions if ps.uid & component_bitmap]
+        )
+        for component_bitmap in component_bitmaps
     ]
-    min_point_coverage = min(point_coverage_counts)
+
+# How many partial solutions cover each of the remaining points of a set,
+# with the points bucketed by that count so a least covered one is found
+# without scanning them all. Each bucket is a bitmap of its points, and the
+# point picked is the lowest bit of the lowest non-empty bucket: the first
+# of the least covered points, which is the column
+# DancingLinks._select_min_covered_column picks too. The lowest non-empty
+# bucket is tracked with a lower bound that only moves up while looking for
+# it, so lookups are O(1) amortized. Every change is kept in a history so a
+# search can roll back to a checkpoint as it backtracks.
+class PointCoverageTracker:
+    _counts = None
+    _buckets = None
+    _min_count_bound = 0
+    _history = None
+
+    def __init__(self, partial_solutions):
+        self._counts = dict.fromkeys(partial_solutions.remaining_points, 0)
+        for ps in partial_solutions:
+            for point in ps.occupied_points:
+                self._counts[point] += 1
+        self._buckets = [0] * (max(self._counts.values(), default=0) + 1)
+        for point, count in self._counts.items():
+            self._buckets[count] |= 1 << point
+        self._min_count_bound = 0
+        self._history = []
+
+    # Returns (point, count) for the first of the least covered points, or
+    # None if no points remain
+    def get_min_covered_point(self):
+        while self._min_count_bound < len(self._buckets):
+            bucket = self._buckets[self._min_count_bound]
+            if bucket:
+                return (bucket & -bucket).bit_length() - 1, self._min_count_bound
+            self._min_count_bound += 1
+        return None
+
+    # The points have been filled, so they're no longer tracked
+    def remove_points(self, points):
+        for point in points:
+            count = self._counts.pop(point)
+            self._buckets[count] ^= 1 << point
+            self._history.append((point, count))
+
+    # The partial solution can no longer be selected, so it no longer covers
+    # its points
+    def remove_partial_solution(self, ps):
+        for point in ps.occupied_points:
+            count = self._counts.get(point)
+            if count is None:
+                continue
+            self._buckets[count] ^= 1 << point
+            self._buckets[count - 1] |= 1 << point
+            self._counts[point] = count - 1
+            if count - 1 < self._min_count_bound:
+                self._min_count_bound = count - 1
+            self._history.append((point, None))
+
+    def checkpoint(self):
+        return len(self._history)
+
+    def rollback(self, checkpoint):
+        while len(self._history) > checkpoint:
+            point, removed_count = self._history.pop()
+            if removed_count is None:
+                count = self._counts[point]
+                self._buckets[count] ^= 1 << point
+                self._buckets[count + 1] |= 1 << point
+                self._counts[point] = count + 1
+            else:
+                self._counts[point] = removed_count
+                self._buckets[removed_count] |= 1 << point
+                if removed_count < self._min_count_bound:
+                    self._min_count_bound = removed_count
+
+# Gives a memo whose keys only mean something in some context (such as the
+# bitboard engine's filled bitmaps, which depend on the grid size) its own
+# part of a shared store, by prefixing every key with the context
+class NamespacedResultStore:
+    _store = None
+    _namespace = None
+
+    def __init__(self, store, namespace):
+        self._store = store
+        self._namespace = namespace
+
+    def _get_key(self, key):
+        return '{}:{}'.format(self._namespace, key)
+
+    def get(self, key):
+        return self._store.get(self._get_key(key))
+
+    def set(self, key, value):
+        self._store.set(self._get_key(key), value)
+
+    def flush(self):
+        self._store.flush()
+
+RESULT_CACHE_MAX_BYTES = 256 * 2 ** 20
+RESULT_STORE_PATH = os.environ.get('BRICK_TILING_RESULT_STORE')
+result_store = PersistentResultStore(RESULT_STORE_PATH) if RESULT_STORE_PATH else None
+result_cache = ResultCache(max_bytes=RESULT_CACHE_MAX_BYTES, store=result_store)
+# A node of the exact cover search that's waiting on its children. A node
+# either multiplies the counts of its independent components or sums the
+# counts of the choices of partial solution for its least covered point.
+class ExactCoverFrame:
+    partial_solutions = None
+    cache_key = None
+    depth = 0
+    solutions_count = 0
+    components = None
+    next_component = 0
+    choices = None
+    coverage = None
+    coverage_checkpoint = None
+    region_count_bound = None
+
+    def __init__(self, partial_solutions, cache_key, depth):
+        self.partial_solutions = partial_solutions
+        self.cache_key = cache_key
+        self.depth = depth
+
+# Returns (count, None) if the node's count is known right away, or else
+# (None, frame) with the frame for counting it
+def visit_exact_cover_node(partial_solutions, cache, depth, mod, coverage, regions, region_count_bound):
+    metrics.increment('exact_cover.recursions')
+
+    cache_key = create_cache_key_for_partial_solution_set(partial_solutions, mod)
+    if tracer is not None:
+        tracer.on_enter_node('exact_cover', cache_key, depth)
+    cached_solutions_count = cache.get(cache_key)
+    if cached_solutions_count is not None:
+        metrics.increment('exact_cover.cache_hits')
+        if tracer is not None:
+            tracer.on_cache_hit('exact_cover', cache_key, depth, cached_solutions_count)
+        return cached_solutions_count, None
+
+    if partial_solutions.num_points % TILE_SIZE != 0:
+        if tracer is not None:
+            tracer.on_prune('exact_cover', cache_key, depth, 'size')
+        cache.set(cache_key, 0, depth)
+        return 0, None
+
+    if coverage is None:
+        coverage = PointCoverageTracker(partial_solutions)
+
+    # Select a point with minimal coverage
+    min_covered_point, min_point_coverage = coverage.get_min_covered_point()
 
     if min_point_coverage == 0:
         # Some points aren't covered by any of the remaining partial solutions,
         # so there aren't any solutions with the partials selected thus far
-        result_cache[cache_key] = 0
-        return 0
+        if tracer is not None:
+            tracer.on_prune('exact_cover', cache_key, depth, 'uncovered')
+        cache.set(cache_key, 0, depth)
+        return 0, None
 
-    # Select a point with minimal coverage
-    index_of_min_covered_point = next(
-        i for i in range(points_to_fill_count)
-        if point_coverage_counts[i] == min_point_coverage
-    )
+    # Points that no chain of tiles connects can be filled independently, so
+    # count each component on its own (each is memoized under its own key)
+    # and multiply the counts. A component is a connected region of points,
+    # and placing a tile can only split the region it's in, so while there
+    # are no more free regions than when the set was last found to be a
+    # single component, its points are still one region and aren't split.
+    if region_count_bound is not None and regions.free_region_count <= region_count_bound:
+        metrics.increment('exact_cover.splits_skipped')
+    else:
+        # Every point is covered by now, so this never returns None
+        components = split_partial_solutions_into_components(partial_solutions)
+        if any(c.num_points % TILE_SIZE != 0 for c in components):
+            if tracer is not None:
+                tracer.on_prune('exact_cover', cache_key, depth, 'component')
+            cache.set(cache_key, 0, depth)
+            return 0, None
+        region_count_bound = regions.free_region_count
+        if len(components) > 1:
+            frame = ExactCoverFrame(partial_solutions, cache_key, depth)
+            frame.components = components
+            frame.solutions_count = 1
+            frame.region_count_bound = region_count_bound
+            return None, frame
 
-    solutions_count = 0
-    partial_solutions_with_min_covered_point = [
+    frame = ExactCoverFrame(partial_solutions, cache_key, depth)
+    frame.coverage = coverage
+    frame.region_count_bound = region_count_bound
+    frame.choices = iter([
         ps for ps in partial_solutions
-        if ps[index_of_min_covered_point] == 1
-    ]
-    for selected_ps in partial_solutions_with_min_covered_point:
-        if len(selected_ps.occupied_points) == points_to_fill_count:
-            # This partial solution fills all the remaining points needing to be
-            # filled, so we've found a solution
+        if ps[min_covered_point] == 1
+    ])
+    return None, frame
 
-            # TODO: How to set cache here?
+# The search is depth-first over an explicit stack of ExactCoverFrames
+# instead of the Python call stack, so its depth isn't bound by the
+# recursion limit. Each placed tile adds at most two frames (a split into
+# components and then a choice within one), so the stack is preallocated to
+# that. A frame's count is memoized when it's popped.
+#
+# coverage is the PointCoverageTracker for partial_solutions, if the caller
+# already has one. It's left as it was given once counting is done. The free
+# regions are tracked over the rows the remaining points span, with every
+# other point taken as filled.
+def count_solutions(partial_solutions, cache=None, depth=0, mod=None, coverage=None):
+    if cache is None:
+        cache = result_cache
 
-            solutions_count += 1
-            continue
+    col_count = partial_solutions.col_count
+    remaining_bitmap = partial_solutions.remaining_bitmap
+    row_count = (remaining_bitmap.bit_length() + col_count - 1) // col_count
+    regions = FreeRegionTracker(
+        row_count,
+        col_count,
+        ((1 << (row_count * col_count)) - 1) & ~remaining_bitmap
+    )
 
-        # Remove partial solutions that overlap with the selected partial solution
-        # Note: We create copies because we're going to remove columns and don't want
-        # to change the originals since we'll revisit back to them as we continue in
-        # the loop
-        # Remove the points covered by the selected partial solution.
-
-        # TODO: Can we exclude ones already looked at in this loop?
-        # TODO: Can maybe save comp if we just count for the reduced_partial_solutions check
-        # and then do the creates after if we don't skip this iteration
-        reduced_partial_solutions = [
-            ps.create_copy(exclude_points=selected_ps.occupied_points)
-            for ps in partial_solutions
-            if not ps.has_overlap(selected_ps)
-        ]
-        if not reduced_partial_solutions:
-            # We still have unfilled points, but no more partial solutions to
-            # select, so there aren't any solutions with this set of selections
-            continue
+    count, frame = visit_exact_cover_node(
+        partial_solutions, cache, depth, mod, coverage, regions, None
+    )
+    if frame is None:
+        return count
 
-        solutions_count += count_solutions(reduced_partial_solutions)
+    frames = [None] * (2 * (partial_solutions.num_points // TILE_SIZE) + 2)
+    frames[0] = frame
+    top = 0
+    while True:
+        # Find the frame's next child to count, if it has any left
+        child = None
+        if frame.components is not None:
+            if frame.next_component < len(frame.components) and frame.solutions_count != 0:
+                child = frame.components[frame.next_component]
+                frame.next_component += 1
+        else:
+            remaining_bitmap = frame.partial_solutions.remaining_bitmap
+            for selected_ps in frame.choices:
+                if selected_ps.uid == remaining_bitmap:
+                    # This partial solution fills all the remaining points needing to be
+                    # filled, so we've found a solution
 
-    result_cache[cache_key] = solutions_count
-    return solutions_count
+                    # TODO: How to set cache here?
+
+                    if tracer is not None:
+                        tracer.on_solution('exact_cover', frame.cache_key, frame.depth + 1)
+                    frame.solutions_count += 1
+                    continue
+
+                # Remove partial solutions that overlap with the selected partial solution
+                # and the points covered by it. The partial solutions are shared with
+                # the original set, which we'll come back to as we continue in the loop.
+
+                # TODO: Can we exclude ones already looked at in this loop?
+                reduced_partial_solutions = PartialSolutionSet(
+                    remaining_bitmap & ~selected_ps.uid,
+                    frame.partial_solutions.col_count
+                )
+                removed_partial_solutions = []
+                for ps in frame.partial_solutions:
+                    if ps.has_overlap(selected_ps):
+                        removed_partial_solutions.append(ps)
+                    else:
+                        reduced_partial_solutions.append(ps)
+                if not reduced_partial_solutions:
+                    # We still have unfilled points, but no more partial solutions to
+                    # select, so there aren't any solutions with this set of selections
+                    continue
+
+                frame.coverage_checkpoint = frame.coverage.checkpoint()
+                frame.coverage.remove_points(selected_ps.occupied_points)
+                for ps in removed_partial_solutions:
+                    frame.coverage.remove_partial_solution(ps)
+                regions.fill(selected_ps.uid)
+                child = reduced_partial_solutions
+                break
 
-def brick_tiling(grid):
-    perf_start = time.time()
+        if child is None:
+            count = frame.solutions_count
+            if mod is not None:
+                count %= mod
+            cache.set(frame.cache_key, count, frame.depth)
+            frames[top] = None
+            top -= 1
+            if top < 0:
+                return count
+            frame = frames[top]
+        else:
+            count, child_frame = visit_exact_cover_node(
+                child, cache, frame.depth + 1, mod, frame.coverage,
+                regions, frame.region_count_bound
+            )
+            if child_frame is not None:
+                top += 1
+                frames[top] = frame = child_frame
+                continue
 
+        # Add the child's count into its parent
+        if frame.components is not None:
+            frame.solutions_count *= count
+        else:
+            frame.solutions_count += count
+            frame.coverage.rollback(frame.coverage_checkpoint)
+            regions.unfill()
+        if mod is not None:
+            frame.solutions_count %= mod
+
+def create_partial_solutions_for_grid(grid):
     grid_row_count = len(grid)
     grid_col_count = len(grid[0])
 
@@ -225,34 +1133,1135 @@ def brick_tiling(grid):
         if grid[row][col] == '#'
     ]
     blocked_points_partial_solution = PartialSolution.create_from_grid(grid, blocked_grid_points)
+    full_bitmap = (1 << (grid_row_count * grid_col_count)) - 1
 
     # For each tile, create a partial solution and filter out the
     # ones that have points that're blocked on the base grid
-    # For each partial solution, remove points that're blocked on the base grid
-    partial_solutions = [
-        partial_solution.create_copy(exclude_points=blocked_points_partial_solution.occupied_points)
-        for row in range(grid_row_count)
-        for col in range(grid_col_count)
-        for partial_solution in generate_partial_solutions_for_grid_point(grid, (row, col))
-        if not partial_solution.has_overlap(blocked_points_partial_solution)
-    ]
+    return PartialSolutionSet(
+        full_bitmap & ~blocked_points_partial_solution.uid,
+        grid_col_count,
+        [
+            partial_solution
+            for row in range(grid_row_count)
+            for col in range(grid_col_count)
+            for partial_solution in generate_partial_solutions_for_grid_point(grid, (row, col))
+            if not partial_solution.has_overlap(blocked_points_partial_solution)
+        ]
+    )
+
+def count_solutions_for_grid_without_tiles(grid):
+    # A fully blocked grid has exactly one (empty) tiling, but free
+    # points that no tile can reach can't be tiled at all
+    is_fully_blocked = all(space == '#' for row in grid for space in row)
+    return 1 if is_fully_blocked else 0
+
+def count_solutions_by_exact_cover(grid, mod=None):
+    partial_solutions = create_partial_solutions_for_grid(grid)
+    if not partial_solutions:
+        return count_solutions_for_grid_without_tiles(grid)
+
+    return count_solutions(partial_solutions, mod=mod)
+
+# Algorithm X over a toroidal doubly-linked list (dancing links). The links
+# are built once from a set of partial solutions: there's a column header per
+# point and a node per (partial solution, occupied point) pair. Covering and
+# uncovering a column only relinks nodes in place, so branching costs O(1) per
+# link instead of copying every surviving partial solution.
+#
+# Node 0 is the root, nodes 1..num_points are the column headers and the rest
+# are the partial solution nodes. Each node's links live in parallel lists.
+class DancingLinks:
+    _left = None
+    _right = None
+    _up = None
+    _down = None
+    _column = None
+    _row = None
+    _column_sizes = None
+    _row_bitmaps = None
+    _result_cache = None
+    _mod = None
+
+    def __init__(self, partial_solutions, mod=None):
+        num_points = partial_solutions.num_points
+        num_headers = num_points + 1
+
+        self._left = [i - 1 for i in range(num_headers)]
+        self._left[0] = num_points
+        self._right = [i + 1 for i in range(num_headers)]
+        self._right[num_points] = 0
+        self._up = list(range(num_headers))
+        self._down = list(range(num_headers))
+        self._column = list(range(num_headers))
+        self._row = [-1] * num_headers
+        self._column_sizes = [0] * num_headers
+        self._row_bitmaps = []
+        self._result_cache = {}
+        self._mod = mod
+
+        # Columns are numbered in the order of the points they stand for
+        column_by_point = {
+            point: i + 1
+            for i, point in enumerate(partial_solutions.remaining_points)
+        }
+
+        for row, partial_solution in enumerate(partial_solutions):
+            self._row_bitmaps.append(partial_solution.uid)
+            first_node = None
+            for point in partial_solution.occupied_points:
+                column = column_by_point[point]
+                node = len(self._column)
+
+                self._column.append(column)
+                self._row.append(row)
+                self._up.append(self._up[column])
+                self._down.append(column)
+                self._down[self._up[column]] = node
+                self._up[column] = node
+                self._column_sizes[column] += 1
+
+                if first_node is None:
+                    first_node = node
+                    self._left.append(node)
+                    self._right.append(node)
+                else:
+                    self._left.append(self._left[first_node])
+                    self._right.append(first_node)
+                    self._right[self._left[first_node]] = node
+                    self._left[first_node] = node
+
+    def _cover(self, column):
+        left, right, up, down = self._left, self._right, self._up, self._down
+        right[left[column]] = right[column]
+        left[right[column]] = left[column]
+        i = down[column]
+        while i != column:
+            j = right[i]
+            while j != i:
+                up[down[j]] = up[j]
+                down[up[j]] = down[j]
+                self._column_sizes[self._column[j]] -= 1
+                j = right[j]
+            i = down[i]
+
+    def _uncover(self, column):
+        left, right, up, down = self._left, self._right, self._up, self._down
+        i = up[column]
+        while i != column:
+            j = left[i]
+            while j != i:
+                self._column_sizes[self._column[j]] += 1
+                up[down[j]] = j
+                down[up[j]] = j
+                j = left[j]
+            i = up[i]
+        right[left[column]] = column
+        left[right[column]] = column
+
+    def _select_min_covered_column(self):
+        # Same choice as count_solutions: the first point with the fewest
+        # partial solutions covering it
+        right = self._right
+        min_column = right[0]
+        min_size = self._column_sizes[min_column]
+        column = right[min_column]
+        while column != 0 and min_size > 0:
+            if self._column_sizes[column] < min_size:
+                min_column = column
+                min_size = self._column_sizes[column]
+            column = right[column]
+        return min_column
 
+    # Every selected partial solution fills one tile's worth of points
+    def _get_depth(self, filled_bitmap):
+        return bin(filled_bitmap).count('1') // TILE_SIZE
+
+    # Depth-first over an explicit stack instead of recursing, so the depth
+    # (a level per tile) isn't bound by the recursion limit. A frame is a
+    # node whose column has been covered, with the row being tried for it and
+    # the count so far. Each node's count is memoized when its frame is
+    # popped. Links are covered and uncovered in the same order as a
+    # recursive search would.
+    def count_solutions(self, filled_bitmap=0):
+        left, right, down = self._left, self._right, self._down
+        column_of, row_of = self._column, self._row
+        column_sizes = self._column_sizes
+        row_bitmaps = self._row_bitmaps
+        result_cache = self._result_cache
+
+        stack_size = len(column_sizes) // TILE_SIZE + 1
+        frame_bitmaps = [0] * stack_size
+        frame_columns = [0] * stack_size
+        frame_nodes = [0] * stack_size
+        frame_counts = [0] * stack_size
+        top = -1
+
+        bitmap = filled_bitmap
+        while True:
+            # Visit the node for bitmap, which either gives its count right
+            # away or pushes a frame and moves on to its first child
+            if right[0] == 0:
+                if tracer is not None:
+                    tracer.on_solution('dancing_links', bitmap, self._get_depth(bitmap))
+                count = 1
+            else:
+                metrics.increment('dancing_links.recursions')
+                if tracer is not None:
+                    tracer.on_enter_node('dancing_links', bitmap, self._get_depth(bitmap))
+
+                # The remaining problem is fully determined by which points
+                # have been filled, since exactly the partial solutions that
+                # don't touch them are still linked in
+                count = result_cache.get(bitmap)
+                if count is not None:
+                    metrics.increment('dancing_links.cache_hits')
+                    if tracer is not None:
+                        tracer.on_cache_hit('dancing_links', bitmap, self._get_depth(bitmap), count)
+                else:
+                    column = self._select_min_covered_column()
+                    if column_sizes[column] == 0:
+                        if tracer is not None:
+                            tracer.on_prune('dancing_links', bitmap, self._get_depth(bitmap), 'uncovered')
+                        result_cache[bitmap] = 0
+                        count = 0
+                    else:
+                        self._cover(column)
+                        node = down[column]
+                        top += 1
+                        frame_bitmaps[top] = bitmap
+                        frame_columns[top] = column
+                        frame_nodes[top] = node
+                        frame_counts[top] = 0
+
+                        j = right[node]
+                        while j != node:
+                            self._cover(column_of[j])
+                            j = right[j]
+                        bitmap |= row_bitmaps[row_of[node]]
+                        continue
+
+            # Hand the count up, popping every frame that has no rows left,
+            # until one has another row to try
+            while True:
+                if top < 0:
+                    return count
+
+                frame_counts[top] += count
+                node = frame_nodes[top]
+                j = left[node]
+                while j != node:
+                    self._uncover(column_of[j])
+                    j = left[j]
+
+                node = down[node]
+                column = frame_columns[top]
+                if node != column:
+                    frame_nodes[top] = node
+                    j = right[node]
+                    while j != node:
+                        self._cover(column_of[j])
+                        j = right[j]
+                    bitmap = frame_bitmaps[top] | row_bitmaps[row_of[node]]
+                    break
+
+                self._uncover(column)
+                count = frame_counts[top]
+                if self._mod is not None:
+                    count %= self._mod
+                result_cache[frame_bitmaps[top]] = count
+                top -= 1
+
+def count_solutions_by_dancing_links(grid, mod=None):
+    partial_solutions = create_partial_solutions_for_grid(grid)
     if not partial_solutions:
-        return 1
+        return count_solutions_for_grid_without_tiles(grid)
+
+    return DancingLinks(partial_solutions, mod).count_solutions()
+
+# Each distinct L tile, described as (row, col) offsets from the first point
+# it covers when walking the grid row by row. Since an L spans at most three
+# rows, no offset is more than two rows below the first point.
+def generate_tile_offsets_from_first_point():
+    tile_offsets = set()
+    for tile in generate_tiles_for_grid_point((0, 0)):
+        first_point = min(tile)
+        tile_offsets.add(tuple(sorted(
+            (point[0] - first_point[0], point[1] - first_point[1])
+            for point in tile
+        )))
+    return sorted(tile_offsets)
+
+TILE_OFFSETS_FROM_FIRST_POINT = generate_tile_offsets_from_first_point()
+
+# For each point, the profile bits of the tiles that can have that point as
+# their first point without leaving the grid or covering a blocked point. Bit
+# 0 is the point itself and later points in the sweep follow in order.
+def generate_tile_bits_for_grid(grid):
+    grid_row_count = len(grid)
+    grid_col_count = len(grid[0])
+
+    tile_bits_for_point = []
+    for row in range(grid_row_count):
+        for col in range(grid_col_count):
+            tile_bits_for_point.append([])
+            if grid[row][col] == '#':
+                continue
+            for tile_offsets in TILE_OFFSETS_FROM_FIRST_POINT:
+                tile_bits = 0
+                for row_offset, col_offset in tile_offsets:
+                    tile_row = row + row_offset
+                    tile_col = col + col_offset
+                    is_in_bounds = (
+                        0 <= tile_row < grid_row_count and
+                        0 <= tile_col < grid_col_count
+                    )
+                    if not is_in_bounds or grid[tile_row][tile_col] == '#':
+                        break
+                    tile_bits |= 1 << (row_offset * grid_col_count + col_offset)
+                else:
+                    tile_bits_for_point[-1].append(tile_bits)
+
+    return tile_bits_for_point
+
+# Advances every profile past the current point. Returns the counts for the
+# profiles that start at the next point.
+def sweep_profile_point(profile_counts, tile_bits, is_blocked, mod=None):
+    next_profile_counts = {}
+    for profile, count in profile_counts.items():
+        if is_blocked or profile & 1:
+            # Nothing to place here, so just move on to the next point.
+            # Tiles never cover blocked points, so a blocked point is
+            # never already filled.
+            next_profile = profile >> 1
+            next_profile_counts[next_profile] = next_profile_counts.get(next_profile, 0) + count
+            continue
+
+        # The current point is still free and every point before it is
+        # filled, so it has to be the first point of the next tile
+        for bits in tile_bits:
+            if profile & bits == 0:
+                next_profile = (profile | bits) >> 1
+                next_profile_counts[next_profile] = next_profile_counts.get(next_profile, 0) + count
+
+    if mod is not None:
+        for next_profile in next_profile_counts:
+            next_profile_counts[next_profile] %= mod
+    return next_profile_counts
+
+# Broken-profile dynamic programming. The grid is swept one point at a time,
+# row by row. The profile is a bitmask of which of the upcoming points have
+# already been filled by tiles placed earlier in the sweep, with bit 0 being
+# the current point. Since a tile's offsets never reach more than two rows
+# ahead, the profile never needs more than (2 * col_count + 3) bits, so the
+# number of distinct profiles is bounded by the width and the work grows
+# linearly with the height.
+def count_solutions_by_profile(grid, mod=None):
+    grid_row_count = len(grid)
+    grid_col_count = len(grid[0])
+    tile_bits_for_point = generate_tile_bits_for_grid(grid)
+
+    profile_counts = {0: 1}
+    for point in range(grid_row_count * grid_col_count):
+        is_blocked = grid[point // grid_col_count][point % grid_col_count] == '#'
+        profile_counts = sweep_profile_point(
+            profile_counts, tile_bits_for_point[point], is_blocked, mod
+        )
+        if not profile_counts:
+            return 0
+
+    return profile_counts.get(0, 0)
+
+# Every L tile that fits on an unobstructed grid of the given size, as a
+# bitmask over the flattened grid, grouped by the first point each covers.
+# Built once per grid size.
+tile_mask_tables = {}
+def get_tile_masks_by_first_point(row_count, col_count):
+    key = (row_count, col_count)
+    if key not in tile_mask_tables:
+        tile_bits_for_point = generate_tile_bits_for_grid(['.' * col_count] * row_count)
+        tile_mask_tables[key] = [
+            [tile_bits << point for tile_bits in tile_bits_for_point[point]]
+            for point in range(row_count * col_count)
+        ]
+    return tile_mask_tables[key]
+
+# Cheap necessary conditions for a set of free points to be fillable, checked
+# on the whole bitboard at once (every row mask in one int) rather than point
+# by point:
+# 1. The number of free points is a multiple of the tile size
+# 2. Every free point is covered by at least one tile that fits. This takes
+#    care of 1-wide corridors and any other dead points, since for each of the
+#    8 tile shapes, the points it fits at are found with one & per tile point.
+# 3. Every connected region of free points has a multiple of the tile size
+#    points. Regions are flood filled with shifts, one step per row or col of
+#    distance rather than one per point.
+#
+# The tables only depend on the grid size, so they're built once per size.
+class PruningTable:
+    _col_count = None
+    _not_first_col_bitmap = None
+    _not_last_col_bitmap = None
+    # For each tile shape, the (shift, col bitmap) for the shape's points,
+    # where col bitmap has the points the shape can start at without running
+    # off either side of the grid
+    _tile_shapes = None
+
+    def __init__(self, row_count, col_count):
+        self._col_count = col_count
+
+        def create_col_bitmap(cols):
+            row_bitmap = 0
+            for col in cols:
+                row_bitmap |= 1 << col
+            bitmap = 0
+            for row in range(row_count):
+                bitmap |= row_bitmap << (row * col_count)
+            return bitmap
+
+        self._not_first_col_bitmap = create_col_bitmap(range(1, col_count))
+        self._not_last_col_bitmap = create_col_bitmap(range(col_count - 1))
+
+        self._tile_shapes = []
+        for tile_offsets in TILE_OFFSETS_FROM_FIRST_POINT:
+            min_col_offset = min([col_offset for _, col_offset in tile_offsets])
+            max_col_offset = max([col_offset for _, col_offset in tile_offsets])
+            start_col_bitmap = create_col_bitmap(
+                range(-min_col_offset, col_count - max_col_offset)
+            )
+            if not start_col_bitmap:
+                # Too wide for the grid
+                continue
+            shifts = [
+                row_offset * col_count + col_offset
+                for row_offset, col_offset in tile_offsets
+            ]
+            self._tile_shapes.append((shifts, start_col_bitmap))
+
+    def get_coverable_bitmap(self, free_bitmap):
+        coverable_bitmap = 0
+        for shifts, start_col_bitmap in self._tile_shapes:
+            start_bitmap = start_col_bitmap
+            for shift in shifts:
+                start_bitmap &= free_bitmap >> shift
+            if start_bitmap:
+                for shift in shifts:
+                    coverable_bitmap |= start_bitmap << shift
+        return coverable_bitmap
+
+    def get_region_bitmap(self, free_bitmap, seed_bitmap):
+        region_bitmap = seed_bitmap
+        while True:
+            grown_bitmap = free_bitmap & (
+                region_bitmap |
+                ((region_bitmap << 1) & self._not_first_col_bitmap) |
+                ((region_bitmap >> 1) & self._not_last_col_bitmap) |
+                (region_bitmap << self._col_count) |
+                (region_bitmap >> self._col_count)
+            )
+            if grown_bitmap == region_bitmap:
+                return region_bitmap
+            region_bitmap = grown_bitmap
+
+    def is_unsolvable(self, free_bitmap):
+        if bin(free_bitmap).count('1') % TILE_SIZE != 0:
+            return True
+
+        if free_bitmap & ~self.get_coverable_bitmap(free_bitmap):
+            return True
+
+        remaining_bitmap = free_bitmap
+        while remaining_bitmap:
+            region_bitmap = self.get_region_bitmap(
+                remaining_bitmap, remaining_bitmap & -remaining_bitmap
+            )
+            if region_bitmap == remaining_bitmap:
+                # Whatever's left is one region, and its size is a multiple
+                # of the tile size since the total is
+                break
+            if bin(region_bitmap).count('1') % TILE_SIZE != 0:
+                return True
+            remaining_bitmap ^= region_bitmap
+
+        return False
+
+# How deep in the search to keep checking the pruning conditions. The root
+# check rejects infeasible grids outright, but deeper down the memo already
+# catches repeated dead ends, and each check costs about as much as visiting
+# ten nodes. On random 20x8 grids with 10% blocked points, checking at every
+# node made counting about 5x slower. Raise this for inputs with lots of
+# isolated pockets.
+PRUNING_MAX_DEPTH = 0
+
+pruning_tables = {}
+def get_pruning_table(row_count, col_count):
+    key = (row_count, col_count)
+    if key not in pruning_tables:
+        pruning_tables[key] = PruningTable(row_count, col_count)
+    return pruning_tables[key]
+
+# Memo of solution counts, keyed by the bitmap of filled points (blocked
+# points included). A bitmap only means something for one grid size and mod,
+# so the memo belongs to the size and mod it was last asked for, and asking
+# for another replaces it. Only one memo is held at a time, so the engine
+# stays within a single RESULT_CACHE_MAX_BYTES budget however many sizes it
+# sees. Batches are solved grouped by size, so each memo is only dropped
+# once its group is done. With a result store, each memo is backed by the
+# part of it for its size and mod, so a dropped memo's counts (and those from
+# earlier runs) are still a lookup away.
+bitboard_result_cache_key = None
+bitboard_result_cache = None
+def get_bitboard_result_cache(row_count, col_count, mod=None):
+    global bitboard_result_cache_key
+    global bitboard_result_cache
+    key = (row_count, col_count, mod)
+    if key != bitboard_result_cache_key:
+        store = None
+        if result_store is not None:
+            store = NamespacedResultStore(
+                result_store, 'bitboard/{}x{}%{}'.format(row_count, col_count, mod)
+            )
+        bitboard_result_cache_key = key
+        bitboard_result_cache = ResultCache(max_bytes=RESULT_CACHE_MAX_BYTES, store=store)
+    return bitboard_result_cache
+
+def create_filled_bitmap_for_grid(grid):
+    col_count = len(grid[0])
+    filled_bitmap = 0
+    for row in range(len(grid)):
+        for col in range(col_count):
+            if grid[row][col] == '#':
+                filled_bitmap |= 1 << (row * col_count + col)
+    return filled_bitmap
+
+# The whole grid is a single int with a bit per point. Every point before the
+# first free point is filled, so the tile that fills it must have it as its
+# first point, and placing one is a single & test and a single |.
+#
+# The search is depth-first over an explicit stack instead of the Python call
+# stack, so its depth (a level per tile) isn't bound by the recursion limit.
+# The stack is preallocated to the most tiles that fit, plus a bottom frame
+# whose only "tile" is the empty one, leading to the starting node. A frame
+# holds a filled bitmap, an iterator over the tile masks for its first free
+# point and the count so far, though the top frame's bitmap and count
+# are kept in locals while it's on top. A frame's count is memoized when it's
+# popped and added to the frame below.
+def count_solutions_for_bitboard(
+    filled_bitmap,
+    full_bitmap,
+    tile_masks_by_first_point,
+    cache,
+    depth=0,
+    mod=None,
+    pruning_table=None,
+    tracer=None
+):
+    stack_size = bin(full_bitmap ^ filled_bitmap).count('1') // TILE_SIZE + 2
+    frame_bitmaps = [0] * stack_size
+    frame_tile_masks = [None] * stack_size
+    frame_counts = [0] * stack_size
+    frame_tile_masks[0] = iter([0])
+    top = 0
+    bitmap = filled_bitmap
+    solutions_count = 0
+
+    get_cached_count = cache.get
+    set_cached_count = cache.set
+    pruning_max_depth = PRUNING_MAX_DEPTH if pruning_table is not None else -1
+
+    while True:
+        # Resumes the top frame's iterator where it left off
+        for tile_mask in frame_tile_masks[top]:
+            if tile_mask & bitmap:
+                continue
+            node_bitmap = bitmap | tile_mask
+            node_depth = depth + top
+
+            if node_bitmap == full_bitmap:
+                if tracer is not None:
+                    tracer.on_solution('bitboard', node_bitmap, node_depth)
+                node_count = 1
+            else:
+                if tracer is not None:
+                    tracer.on_enter_node('bitboard', node_bitmap, node_depth)
+                node_count = get_cached_count(node_bitmap)
+                if node_count is not None:
+                    if tracer is not None:
+                        tracer.on_cache_hit('bitboard', node_bitmap, node_depth, node_count)
+                else:
+                    free_bitmap = full_bitmap ^ node_bitmap
+                    if node_depth <= pruning_max_depth and pruning_table.is_unsolvable(free_bitmap):
+                        if tracer is not None:
+                            tracer.on_prune('bitboard', node_bitmap, node_depth, 'unsolvable')
+                        node_count = 0
+                        set_cached_count(node_bitmap, 0, node_depth)
+                    else:
+                        # Push a frame for the node and carry on with it
+                        frame_bitmaps[top] = bitmap
+                        frame_counts[top] = solutions_count
+                        first_free_point = (free_bitmap & -free_bitmap).bit_length() - 1
+                        top += 1
+                        frame_tile_masks[top] = iter(tile_masks_by_first_point[first_free_point])
+                        bitmap = node_bitmap
+                        solutions_count = 0
+                        break
+
+            solutions_count += node_count
+        else:
+            # The top frame has no tiles left, so pop it
+            if mod is not None:
+                solutions_count %= mod
+            if top == 0:
+                return solutions_count
+            set_cached_count(bitmap, solutions_count, depth + top - 1)
+            top -= 1
+            bitmap = frame_bitmaps[top]
+            solutions_count += frame_counts[top]
+
+def count_solutions_by_bitboard(grid, mod=None):
+    row_count = len(grid)
+    col_count = len(grid[0])
+    filled_bitmap = create_filled_bitmap_for_grid(grid)
+    return count_solutions_for_bitboard(
+        filled_bitmap,
+        (1 << (row_count * col_count)) - 1,
+        get_tile_masks_by_first_point(row_count, col_count),
+        get_bitboard_result_cache(row_count, col_count, mod),
+        mod=mod,
+        pruning_table=get_pruning_table(row_count, col_count),
+        tracer=tracer
+    )
+
+# Lazily yields every tiling of the grid as a list of tile masks (see
+# get_tile_masks_by_first_point). It's a depth-first walk of the bitboard
+# search with no memo, so nothing is kept beyond the tiles placed on the
+# current path, and taking the first few tilings (e.g. with itertools.islice)
+# only explores as much of the search as it takes to find them. The walk
+# uses an explicit stack rather than recursing, so tall grids don't hit the
+# recursion limit. Each frame has its node's filled bitmap and an iterator
+# over the tiles for its first free point, and the tile it's trying is the
+# frame's entry in placed_tile_masks.
+def iter_tilings(grid):
+    row_count = len(grid)
+    col_count = len(grid[0])
+    full_bitmap = (1 << (row_count * col_count)) - 1
+    tile_masks_by_first_point = get_tile_masks_by_first_point(row_count, col_count)
+    pruning_table = get_pruning_table(row_count, col_count)
+
+    def iter_tilings_from(filled_bitmap):
+        stack_size = bin(full_bitmap ^ filled_bitmap).count('1') // TILE_SIZE + 1
+        frame_bitmaps = [0] * stack_size
+        frame_tile_masks = [None] * stack_size
+        placed_tile_masks = []
+        top = -1
+
+        node_bitmap = filled_bitmap
+        while True:
+            if node_bitmap == full_bitmap:
+                yield list(placed_tile_masks)
+            else:
+                free_bitmap = full_bitmap ^ node_bitmap
+                is_pruning = len(placed_tile_masks) <= PRUNING_MAX_DEPTH
+                if not (is_pruning and pruning_table.is_unsolvable(free_bitmap)):
+                    first_free_point = (free_bitmap & -free_bitmap).bit_length() - 1
+                    top += 1
+                    frame_bitmaps[top] = node_bitmap
+                    frame_tile_masks[top] = iter(tile_masks_by_first_point[first_free_point])
+                    placed_tile_masks.append(0)
+
+            # Move on to the next tile that fits, popping frames that have
+            # run out of them
+            while top >= 0:
+                bitmap = frame_bitmaps[top]
+                for tile_mask in frame_tile_masks[top]:
+                    if tile_mask & bitmap == 0:
+                        break
+                else:
+                    top -= 1
+                    placed_tile_masks.pop()
+                    continue
+                placed_tile_masks[-1] = tile_mask
+                node_bitmap = bitmap | tile_mask
+                break
+            else:
+                return
+
+    return iter_tilings_from(create_filled_bitmap_for_grid(grid))
+
+def print_tiling(grid, tiling):
+    col_count = len(grid[0])
+    rows = [list(row) for row in grid]
+    for i in range(len(tiling)):
+        symbol = chr(ord('A') + i % 26)
+        for point in range(len(grid) * col_count):
+            if tiling[i] & (1 << point):
+                rows[point // col_count][point % col_count] = symbol
+    for row in rows:
+        print(' '.join(row))
+    print('')
 
-    count = count_solutions(partial_solutions)
+# Draws tilings uniformly at random. Each sample walks down the bitboard
+# search, picking each tile with probability proportional to the number of
+# tilings under it. The sub-counts come from the bitboard memo (exact counts,
+# never modulo), so after the first sample has filled it in, each further one
+# only costs a few lookups per tile.
+def sample_tilings(grid, sample_count, rng=None):
+    if rng is None:
+        rng = random.Random()
 
-    perf_end = time.time()
-    debug_print('============')
-    debug_print('FINAL RESULT: {}'.format(count))
-    debug_print('------------')
-    debug_print('Time: {}'.format(perf_end - perf_start))
-    debug_print('Recursion count: {}'.format(recursion_count))
-    debug_print('Cache hits: {}'.format(cache_hits))
-    debug_print('Create cache key time: {}'.format(sum(perf_create_cache_key)))
+    row_count = len(grid)
+    col_count = len(grid[0])
+    full_bitmap = (1 << (row_count * col_count)) - 1
+    tile_masks_by_first_point = get_tile_masks_by_first_point(row_count, col_count)
+    cache = get_bitboard_result_cache(row_count, col_count)
+
+    def count_solutions_from(filled_bitmap, pruning_table=None):
+        return count_solutions_for_bitboard(
+            filled_bitmap,
+            full_bitmap,
+            tile_masks_by_first_point,
+            cache,
+            pruning_table=pruning_table
+        )
+
+    initial_filled_bitmap = create_filled_bitmap_for_grid(grid)
+    pruning_table = get_pruning_table(row_count, col_count)
+    if count_solutions_from(initial_filled_bitmap, pruning_table) == 0:
+        raise Exception('Grid has no tilings to sample from')
+
+    samples = []
+    for _ in range(sample_count):
+        tiling = []
+        filled_bitmap = initial_filled_bitmap
+        while filled_bitmap != full_bitmap:
+            free_bitmap = full_bitmap ^ filled_bitmap
+            first_free_point = (free_bitmap & -free_bitmap).bit_length() - 1
+
+            choices = []
+            total = 0
+            for tile_mask in tile_masks_by_first_point[first_free_point]:
+                if tile_mask & filled_bitmap == 0:
+                    count = count_solutions_from(filled_bitmap | tile_mask)
+                    if count > 0:
+                        choices.append((tile_mask, count))
+                        total += count
+
+            selection = rng.randrange(total)
+            for tile_mask, count in choices:
+                if selection < count:
+                    break
+                selection -= count
+
+            tiling.append(tile_mask)
+            filled_bitmap |= tile_mask
+        samples.append(tiling)
+
+    return samples
+
+def sample_tiling(grid, rng=None):
+    return sample_tilings(grid, 1, rng)[0]
+
+# Meet in the middle. The grid is cut at its middle row and every tile goes
+# to the top half if its first point is above the cut, or to the bottom half
+# otherwise. A top tile reaches at most two rows past the cut, so the halves
+# only meet in the two boundary rows below it: a tiling of the grid is a
+# tiling of each half where the bottom half leaves free exactly the boundary
+# points that the top half fills. Each half is counted once for every
+# boundary profile, and the dot product of the two tables is the count for
+# the whole grid.
+def get_meet_in_the_middle_cut_point(grid):
+    return (len(grid) // 2) * len(grid[0])
+
+# Every tile that fits on the grid without covering a blocked point, as a
+# bitmap over the flattened grid
+def generate_tile_bitmaps_for_grid(grid):
+    blocked_bitmap = create_filled_bitmap_for_grid(grid)
+    tile_bitmaps = set()
+    for row in range(len(grid)):
+        for col in range(len(grid[0])):
+            if grid[row][col] == '#':
+                continue
+            for partial_solution in generate_partial_solutions_for_grid_point(grid, (row, col)):
+                if partial_solution.uid & blocked_bitmap == 0:
+                    tile_bitmaps.add(partial_solution.uid)
+    return sorted(tile_bitmaps)
+
+# Sweeps the top half forward, the same way as the profile engine, and stops
+# at the cut. The profiles left there are the boundary profiles, with bit i
+# for the point i places past the cut.
+def count_top_half_solutions_by_boundary_profile(grid, cut_point, mod=None):
+    col_count = len(grid[0])
+    tile_bits_for_point = [[] for _ in range(cut_point)]
+    for tile_bitmap in generate_tile_bitmaps_for_grid(grid):
+        first_point = (tile_bitmap & -tile_bitmap).bit_length() - 1
+        if first_point < cut_point:
+            tile_bits_for_point[first_point].append(tile_bitmap >> first_point)
+
+    profile_counts = {0: 1}
+    for point in range(cut_point):
+        is_blocked = grid[point // col_count][point % col_count] == '#'
+        profile_counts = sweep_profile_point(
+            profile_counts, tile_bits_for_point[point], is_blocked, mod
+        )
+        if not profile_counts:
+            break
+
+    return profile_counts
+
+# Sweeps the bottom half backward from the last point, so each tile is placed
+# at its last point and profile bit i is for the point i places before the
+# current one. A boundary point that's still free can also be left for the
+# top half to fill, so each state pairs the profile with the boundary points
+# left so far, laid out like the top half's boundary profiles.
+def count_bottom_half_solutions_by_boundary_profile(grid, cut_point, mod=None):
+    col_count = len(grid[0])
+    point_count = len(grid) * col_count
+    boundary_end_point = min(cut_point + 2 * col_count, point_count)
+
+    tile_bits_for_point = [[] for _ in range(point_count)]
+    for tile_bitmap in generate_tile_bitmaps_for_grid(grid):
+        first_point = (tile_bitmap & -tile_bitmap).bit_length() - 1
+        if first_point < cut_point:
+            continue
+        last_point = tile_bitmap.bit_length() - 1
+        tile_bits = 0
+        for point in get_points_in_bitmap(tile_bitmap):
+            tile_bits |= 1 << (last_point - point)
+        tile_bits_for_point[last_point].append(tile_bits)
+
+    state_counts = {(0, 0): 1}
+    for point in range(point_count - 1, cut_point - 1, -1):
+        is_blocked = grid[point // col_count][point % col_count] == '#'
+        left_bit = 1 << (point - cut_point) if point < boundary_end_point else 0
+        next_state_counts = {}
+        for (profile, left_bitmap), count in state_counts.items():
+            if is_blocked or profile & 1:
+                next_state = (profile >> 1, left_bitmap)
+                next_state_counts[next_state] = next_state_counts.get(next_state, 0) + count
+                continue
+
+            if left_bit:
+                next_state = (profile >> 1, left_bitmap | left_bit)
+                next_state_counts[next_state] = next_state_counts.get(next_state, 0) + count
+            for bits in tile_bits_for_point[point]:
+                if profile & bits == 0:
+                    next_state = ((profile | bits) >> 1, left_bitmap)
+                    next_state_counts[next_state] = next_state_counts.get(next_state, 0) + count
+
+        if mod is not None:
+            for next_state in next_state_counts:
+                next_state_counts[next_state] %= mod
+        state_counts = next_state_counts
+        if not state_counts:
+            break
+
+    # Bottom tiles never reach above the cut, so every profile is empty by
+    # the time the sweep gets there
+    return {left_bitmap: count for (_, left_bitmap), count in state_counts.items()}
+
+def join_boundary_profile_counts(top_counts, bottom_counts, mod=None):
+    metrics.increment('meet_in_the_middle.top_profiles', len(top_counts))
+    metrics.increment('meet_in_the_middle.bottom_profiles', len(bottom_counts))
+    solutions_count = sum(
+        count * bottom_counts.get(profile, 0)
+        for profile, count in top_counts.items()
+    )
+    if mod is not None:
+        solutions_count %= mod
+    return solutions_count
+
+def count_solutions_by_meet_in_the_middle(grid, mod=None):
+    cut_point = get_meet_in_the_middle_cut_point(grid)
+    return join_boundary_profile_counts(
+        count_top_half_solutions_by_boundary_profile(grid, cut_point, mod),
+        count_bottom_half_solutions_by_boundary_profile(grid, cut_point, mod),
+        mod
+    )
+
+def send_top_half_solutions_by_boundary_profile(grid, cut_point, mod, connection):
+    connection.send(count_top_half_solutions_by_boundary_profile(grid, cut_point, mod))
+    connection.close()
+
+# The halves don't depend on each other, so the top half is counted in a
+# forked process while this one counts the bottom half. Forking (rather than
+# a process pool) means nothing has to be pickled but the grid and the
+# resulting table, so it works however this file was imported, and the child
+# starts with the tile tables already built.
+#
+# There's nothing worth splitting beyond the two halves. Cutting the grid into
+# more slabs means counting every slab between the top and bottom ones for
+# each pair of profiles at its edges, which on a 20x8 grid takes ten times as
+# long as the profile engine takes for the whole grid. So more than two
+# workers is an error rather than something that's quietly ignored.
+MAX_WORKERS = 2
+def count_solutions_by_meet_in_the_middle_in_parallel(grid, workers, mod=None):
+    if not 1 <= workers <= MAX_WORKERS:
+        raise Exception('Can count a grid with 1 to {} workers, got {}'.format(MAX_WORKERS, workers))
+    if workers == 1:
+        return count_solutions_by_meet_in_the_middle(grid, mod)
+
+    cut_point = get_meet_in_the_middle_cut_point(grid)
+    context = multiprocessing.get_context('fork')
+    parent_connection, child_connection = context.Pipe(duplex=False)
+    process = context.Process(
+        target=send_top_half_solutions_by_boundary_profile,
+        args=(grid, cut_point, mod, child_connection)
+    )
+    process.start()
+    child_connection.close()
+
+    bottom_counts = count_bottom_half_solutions_by_boundary_profile(grid, cut_point, mod)
+    try:
+        top_counts = parent_connection.recv()
+    except EOFError:
+        process.join()
+        raise Exception('Worker counting the top half exited with code {}'.format(process.exitcode))
+    finally:
+        process.join()
+    return join_boundary_profile_counts(top_counts, bottom_counts, mod)
+
+# Transitions between row profiles for an unobstructed grid of the given
+# width. A row profile is the profile at the start of a row, which only ever
+# has bits for that row and the one after it. Only profiles that are
+# reachable from an empty row and can get back to one are kept, since no
+# other profile can contribute to a count.
+def generate_row_transitions(col_count):
+    # Tiles for the first row of a grid that's tall enough for every tile
+    row_tile_bits = generate_tile_bits_for_grid(['.' * col_count] * 3)[:col_count]
+
+    row_transitions = {}
+    unexplored = [0]
+    while unexplored:
+        row_profile = unexplored.pop()
+        profile_counts = {row_profile: 1}
+        for col in range(col_count):
+            profile_counts = sweep_profile_point(profile_counts, row_tile_bits[col], False)
+        row_transitions[row_profile] = profile_counts
+        for next_row_profile in profile_counts:
+            if next_row_profile not in row_transitions and next_row_profile not in unexplored:
+                unexplored.append(next_row_profile)
+
+    previous_row_profiles = {}
+    for row_profile, profile_counts in row_transitions.items():
+        for next_row_profile in profile_counts:
+            previous_row_profiles.setdefault(next_row_profile, []).append(row_profile)
+    can_finish = {0}
+    unexplored = [0]
+    while unexplored:
+        row_profile = unexplored.pop()
+        for previous_row_profile in previous_row_profiles.get(row_profile, []):
+            if previous_row_profile not in can_finish:
+                can_finish.add(previous_row_profile)
+                unexplored.append(previous_row_profile)
+
+    return {
+        row_profile: {
+            next_row_profile: count
+            for next_row_profile, count in profile_counts.items()
+            if next_row_profile in can_finish
+        }
+        for row_profile, profile_counts in row_transitions.items()
+        if row_profile in can_finish
+    }
+
+# Berlekamp-Massey. Finds the shortest recurrence such that
+# sequence[i] = SUM_j_1_d(recurrence[j - 1] x sequence[i - j]) (mod mod)
+def find_linear_recurrence(sequence, mod):
+    current = [1] + [0] * len(sequence)
+    previous = [1] + [0] * len(sequence)
+    length = 0
+    shift = 0
+    previous_discrepancy = 1
+    for i in range(len(sequence)):
+        shift += 1
+        discrepancy = sequence[i]
+        for j in range(1, length + 1):
+            discrepancy = (discrepancy + current[j] * sequence[i - j]) % mod
+        if discrepancy == 0:
+            continue
+
+        before_update = current[:]
+        scale = discrepancy * pow(previous_discrepancy, mod - 2, mod) % mod
+        for j in range(shift, len(current)):
+            current[j] = (current[j] - scale * previous[j - shift]) % mod
+        if 2 * length > i:
+            continue
+
+        length = i + 1 - length
+        previous = before_update
+        previous_discrepancy = discrepancy
+        shift = 0
+
+    return [(-c) % mod for c in current[1:length + 1]]
+
+# The transfer matrix for a width, reduced to the recurrence its [0][0] entry
+# follows over the height. The sequence is seeded by pushing a vector through
+# the row transitions, and its recurrence is no longer than the number of row
+# profiles, so twice that many terms are enough to find it.
+transfer_matrix_cache = {}
+def get_transfer_matrix_recurrence(col_count, mod):
+    if mod is None:
+        raise Exception('The transfer matrix recurrence is found modulo a prime, so a mod is required')
+
+    key = (col_count, mod)
+    if key in transfer_matrix_cache:
+        return transfer_matrix_cache[key]
+
+    row_transitions = generate_row_transitions(col_count)
+
+    counts_by_height = []
+    profile_counts = {0: 1}
+    for _ in range(2 * len(row_transitions) + 1):
+        counts_by_height.append(profile_counts.get(0, 0))
+        next_profile_counts = {}
+        for row_profile, count in profile_counts.items():
+            for next_row_profile, ways in row_transitions[row_profile].items():
+                next_profile_counts[next_row_profile] = (
+                    next_profile_counts.get(next_row_profile, 0) + count * ways
+                ) % mod
+        profile_counts = next_profile_counts
+
+    recurrence = find_linear_recurrence(counts_by_height, mod)
+    transfer_matrix_cache[key] = (recurrence, counts_by_height[:len(recurrence)])
+    return transfer_matrix_cache[key]
+
+# Product of two polynomials (lowest power first), reduced by the
+# characteristic polynomial of the recurrence
+def multiply_polynomials_mod_recurrence(p1, p2, recurrence, mod):
+    product = [0] * (len(p1) + len(p2) - 1)
+    for i in range(len(p1)):
+        if p1[i] == 0:
+            continue
+        for j in range(len(p2)):
+            product[i + j] = (product[i + j] + p1[i] * p2[j]) % mod
+
+    order = len(recurrence)
+    for i in range(len(product) - 1, order - 1, -1):
+        if product[i] == 0:
+            continue
+        for j in range(order):
+            product[i - j - 1] = (product[i - j - 1] + product[i] * recurrence[j]) % mod
+        product[i] = 0
+
+    return product[:order]
+
+# Number of ways to tile an unobstructed grid, modulo mod. This is entry
+# [0][0] of the transfer matrix raised to the height, computed by repeated
+# squaring of x modulo the matrix's recurrence.
+def count_unobstructed_solutions(row_count, col_count, mod=MOD):
+    recurrence, initial_counts = get_transfer_matrix_recurrence(col_count, mod)
+    if row_count < len(initial_counts):
+        return initial_counts[row_count]
+
+    result = [1]
+    power = [0, 1] if len(recurrence) > 1 else [recurrence[0]]
+    exponent = row_count
+    while exponent > 0:
+        if exponent & 1:
+            result = multiply_polynomials_mod_recurrence(result, power, recurrence, mod)
+        power = multiply_polynomials_mod_recurrence(power, power, recurrence, mod)
+        exponent >>= 1
+
+    return sum(
+        result[i] * initial_counts[i] for i in range(len(result))
+    ) % mod
+
+# Number of ways to tile an unobstructed grid for every height from 1 to
+# row_count, modulo mod
+def get_unobstructed_solution_counts(row_count, col_count, mod=MOD):
+    recurrence, initial_counts = get_transfer_matrix_recurrence(col_count, mod)
+    counts_by_height = initial_counts[:row_count + 1]
+    while len(counts_by_height) <= row_count:
+        counts_by_height.append(sum(
+            recurrence[j] * counts_by_height[-j - 1] for j in range(len(recurrence))
+        ) % mod)
+
+    return counts_by_height[1:]
+
+ENGINES = {
+    'exact_cover': count_solutions_by_exact_cover,
+    'dancing_links': count_solutions_by_dancing_links,
+    'profile': count_solutions_by_profile,
+    'bitboard': count_solutions_by_bitboard,
+    'meet_in_the_middle': count_solutions_by_meet_in_the_middle,
+}
+
+# Only meet in the middle splits a grid into parts that can be counted
+# separately, so every engine counts that way when given workers
+def count_solutions_by_engine(grid, engine, workers=None, mod=None):
+    if workers is not None and workers != 1:
+        return count_solutions_by_meet_in_the_middle_in_parallel(grid, workers, mod)
+    return ENGINES[engine](grid, mod)
+
+def brick_tiling(grid, engine='exact_cover', workers=None, mod=None):
+    metrics.reset()
+    perf_start = time.perf_counter_ns()
+
+    count = count_solutions_by_engine(grid, engine, workers, mod)
+    result_cache.flush()
+
+    metrics.record('brick_tiling.{}_ns'.format(engine), time.perf_counter_ns() - perf_start)
+    if DEBUG:
+        debug_print('============')
+        debug_print('FINAL RESULT: {}'.format(count))
+        debug_print('------------')
+        debug_print('Engine: {}'.format(engine))
+        debug_print('Metrics: {}'.format(metrics.to_json()))
+        debug_print('Result cache: {}'.format(result_cache.stats))
 
     return count
 
+def is_unobstructed_grid(grid):
+    return all('#' not in row for row in grid)
+
+# Solves a batch of grids, grouped by size so that each group shares its tile
+# tables and memo entries. Yields (index, count) as each grid is solved, which
+# isn't necessarily in the order the grids were given. When counting modulo
+# mod, unobstructed grids skip the engine and are counted with the transfer
+# matrix.
+def iter_brick_tiling_many(grids, engine='bitboard', mod=None, workers=None):
+    indexes_by_size = {}
+    for index, grid in enumerate(grids):
+        indexes_by_size.setdefault((len(grid), len(grid[0])), []).append(index)
+
+    for size in sorted(indexes_by_size):
+        for index in indexes_by_size[size]:
+            grid = grids[index]
+            if mod is not None and is_unobstructed_grid(grid):
+                yield index, count_unobstructed_solutions(len(grid), len(grid[0]), mod)
+            else:
+                yield index, count_solutions_by_engine(grid, engine, workers, mod)
+        result_cache.flush()
+
+def brick_tiling_many(grids, engine='bitboard', mod=None, workers=None):
+    counts = [None] * len(grids)
+    for index, count in iter_brick_tiling_many(grids, engine, mod, workers):
+        counts[index] = count
+    return counts
+
+# Reads all the test cases up front, in HackerRank's format: the number of
+# grids, then for each one a line with its row and col counts followed by
+# its rows.
+def read_grids(input_stream):
+    lines = iter(input_stream.read().split())
+    grids = []
+    for _ in range(int(next(lines))):
+        row_count = int(next(lines))
+        next(lines)
+        grids.append([next(lines) for _ in range(row_count)])
+    return grids
+
+# Writes each count as soon as it and every count before it are known, so
+# results stream out in input order while later grids are still being solved
+def write_brick_tiling_many(grids, output_stream, engine='bitboard', mod=MOD, workers=None):
+    counts = {}
+    next_index = 0
+    for index, count in iter_brick_tiling_many(grids, engine, mod, workers):
+        counts[index] = count
+        while next_index in counts:
+            output_stream.write(str(counts.pop(next_index)) + '\n')
+            next_index += 1
+        output_stream.flush()
+
 test_cases = []
 # test_cases.append([
 #     '....',
@@ -387,30 +2396,58 @@ test_cases.append([
 #     '........'
 # ])
 
-for test_case in test_cases:
-    brick_tiling(test_case)
-
+def run_test_cases():
+    for test_case in test_cases:
+        brick_tiling(test_case)
 
-# if __name__ == '__main__':
-#     fptr = open(os.environ['OUTPUT_PATH'], 'w')
 
-#     t = int(input())
-
-#     for t_itr in range(t):
-#         nm = input().split()
-
-#         n = int(nm[0])
-
-#         m = int(nm[1])
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Counts brick tilings for grids in HackerRank input format read from stdin'
+    )
+    parser.add_argument('--engine', default='bitboard', choices=sorted(ENGINES))
+    parser.add_argument(
+        '--exact',
+        action='store_true',
+        help='write exact counts instead of counts modulo {}'.format(MOD)
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        choices=range(1, MAX_WORKERS + 1),
+        help='processes to count each grid with, by meet in the middle whatever the engine'
+    )
+    parser.add_argument(
+        '--test-cases',
+        action='store_true',
+        help='run the test cases in this file instead of reading stdin'
+    )
+    parser.add_argument(
+        '--trace',
+        metavar='PATH',
+        help='write a JSONL trace of the search to PATH (see read_trace)'
+    )
+    args = parser.parse_args()
 
-#         grid = []
+    trace_file = None
+    if args.trace:
+        trace_file = open(args.trace, 'w')
+        set_tracer(JsonlTracer(trace_file))
 
-#         for _ in range(n):
-#             grid_item = input()
-#             grid.append(grid_item)
+    if args.test_cases:
+        run_test_cases()
+    else:
+        DEBUG = False
+        output_path = os.environ.get('OUTPUT_PATH')
+        fptr = open(output_path, 'w') if output_path else sys.stdout
 
-#         result = brick_tiling(grid)
+        write_brick_tiling_many(
+            read_grids(sys.stdin), fptr, args.engine, None if args.exact else MOD, args.workers
+        )
 
-#         fptr.write(str(result) + '\n')
+        if output_path:
+            fptr.close()
 
-#     fptr.close()
+    if trace_file:
+        tracer.close()
+        trace_file.close()
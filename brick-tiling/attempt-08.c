@@ -1,4 +1,5 @@
 #include <assert.h>
+#include <ctype.h>
 #include <limits.h>
 #include <math.h>
 #include <stdbool.h>
@@ -10,11 +11,13 @@
 // srand(time(0));
 // rand();
 
+const long long MOD = 1000000007;
+
 int get_partial_solution_len(int row_count, int col_count) {
     return row_count * col_count;
 }
 
-bool* allocate_partial_solution(count) {
+bool* allocate_partial_solution(size_t count) {
     return (bool*) calloc(count, sizeof(bool));
 }
 
@@ -37,7 +40,7 @@ bool do_partial_solutions_conflict(
 
 bool are_all_spaces_in_partial_solution_full(const bool* ps, const int ps_len) {
     for (int i = 0; i < ps_len; i++) {
-        if (ps[0] == false) {
+        if (ps[i] == false) {
             return false;
         }
     }
@@ -176,8 +179,10 @@ void allocate_partial_solutions_for_grid(
         }
     }
 
-    // Trim all columns that're already filled on the grid
-    for (int point = 0; point < ps_len; point++) {
+    // Trim all columns that're already filled on the grid. Going from the
+    // last column to the first means removing a column doesn't shift the
+    // columns still to be checked.
+    for (int point = ps_len - 1; point >= 0; point--) {
         if (grid_ps[point] == true) {
             remove_col_from_partial_solutions(
                 partial_solutions,
@@ -188,6 +193,7 @@ void allocate_partial_solutions_for_grid(
             ps_len--;
         }
     }
+    free(grid_ps);
 
     (*partial_solutions_ref) = partial_solutions;
     (*partial_solutions_count_ref) = partial_solutions_count;
@@ -212,75 +218,91 @@ bool is_grid_fully_blocked(char** grid, int row_count, int col_count) {
     return true;
 }
 
-// int count_solutions(partial_solutions) {
-//     points_to_fill_count = len(partial_solutions[0])
-
-//     global recursion_count
-//     recursion_count += 1
-
-//     global cache_hits
-//     cache_key = create_cache_key_for_partial_solution_set(partial_solutions)
-//     if cache_key in result_cache:
-//         cache_hits += 1
-//         return result_cache[cache_key]
-
-//     # How many partial solutions cover a given point
-//     point_coverage_counts = [
-//         sum([ps[col] for ps in partial_solutions])
-//         for col in range(points_to_fill_count)
-//     ]
-//     min_point_coverage = min(point_coverage_counts)
-
-//     if min_point_coverage == 0:
-//         # Some points aren't covered by any of the remaining partial solutions,
-//         # so there aren't any solutions with the partials selected thus far
-//         result_cache[cache_key] = 0
-//         return 0
-
-//     # Select a point with minimal coverage
-//     index_of_min_covered_point = next(
-//         i for i in range(points_to_fill_count)
-//         if point_coverage_counts[i] == min_point_coverage
-//     )
-
-//     solutions_count = 0
-//     partial_solutions_with_min_covered_point = [
-//         ps for ps in partial_solutions
-//         if ps[index_of_min_covered_point] == 1
-//     ]
-//     for selected_ps in partial_solutions_with_min_covered_point:
-//         indexes_of_points_covered_by_selected_ps = [
-//             i for i in range(points_to_fill_count)
-//             if selected_ps[i] == 1
-//         ]
-
-//         if len(indexes_of_points_covered_by_selected_ps) == points_to_fill_count:
-//             # This partial solution fills all the remaining points needing to be
-//             # filled, so we've found a solution
-
-//             # TODO: How to set cache here?
-
-//             solutions_count += 1
-//             continue
-
-//         # Remove partial solutions that overlap with the selected partial solution and
-//         # from each of those, remove the points covered by the selected partial solution.
-//         reduced_partial_solutions = [
-//             [ps[i] for i in range(len(ps)) if i not in indexes_of_points_covered_by_selected_ps]
-//             for ps in partial_solutions # TODO: Exclude the ones already looked at in this loop
-//             if not do_partial_solutions_conflict(ps, selected_ps)
-//         ]
-
-//         if not reduced_partial_solutions:
-//             # We still have unfilled points, but no more partial solutions to
-//             # select, so there aren't any solutions with this set of selections
-//             continue
-
-//         solutions_count += count_solutions(reduced_partial_solutions)
-
-//     result_cache[cache_key] = solutions_count
-//     return solutions_count
-// }
+// Counts the ways to select partial solutions such that every point is
+// covered exactly once, modulo MOD. This follows count_solutions from
+// attempt-06, without the result cache.
+long long count_solutions(bool** partial_solutions, const int ps_count, const int ps_len) {
+    if (ps_len % 4 != 0) {
+        return 0;
+    }
+
+    // Select a point with minimal coverage
+    int min_point_coverage = INT_MAX;
+    int index_of_min_covered_point = 0;
+    for (int point = 0; point < ps_len; point++) {
+        int point_coverage = 0;
+        for (int i = 0; i < ps_count; i++) {
+            point_coverage += partial_solutions[i][point];
+        }
+        if (point_coverage < min_point_coverage) {
+            min_point_coverage = point_coverage;
+            index_of_min_covered_point = point;
+        }
+    }
+
+    if (min_point_coverage == 0) {
+        // Some points aren't covered by any of the remaining partial solutions,
+        // so there aren't any solutions with the partials selected thus far
+        return 0;
+    }
+
+    long long solutions_count = 0;
+    bool** reduced_partial_solutions = (bool**) calloc(ps_count, sizeof(bool*));
+    for (int selected = 0; selected < ps_count; selected++) {
+        const bool* selected_ps = partial_solutions[selected];
+        if (!selected_ps[index_of_min_covered_point]) {
+            continue;
+        }
+
+        int selected_point_count = 0;
+        for (int point = 0; point < ps_len; point++) {
+            selected_point_count += selected_ps[point];
+        }
+        if (selected_point_count == ps_len) {
+            // This partial solution fills all the remaining points needing to be
+            // filled, so we've found a solution
+            solutions_count++;
+            continue;
+        }
+
+        // Keep the partial solutions that don't overlap with the selected
+        // one, minus the points it covers
+        const int reduced_ps_len = ps_len - selected_point_count;
+        assert(reduced_ps_len > 0);
+        int reduced_ps_count = 0;
+        for (int i = 0; i < ps_count; i++) {
+            if (do_partial_solutions_conflict(ps_len, partial_solutions[i], selected_ps)) {
+                continue;
+            }
+            bool* reduced_ps = allocate_partial_solution(reduced_ps_len);
+            int dest_point = 0;
+            for (int point = 0; point < ps_len; point++) {
+                if (!selected_ps[point]) {
+                    reduced_ps[dest_point] = partial_solutions[i][point];
+                    dest_point++;
+                }
+            }
+            reduced_partial_solutions[reduced_ps_count] = reduced_ps;
+            reduced_ps_count++;
+        }
+
+        // With no partial solutions left, there are still unfilled points
+        // and nothing to fill them with
+        if (reduced_ps_count > 0) {
+            solutions_count += count_solutions(
+                reduced_partial_solutions, reduced_ps_count, reduced_ps_len
+            );
+            solutions_count %= MOD;
+        }
+
+        for (int i = 0; i < reduced_ps_count; i++) {
+            free(reduced_partial_solutions[i]);
+        }
+    }
+    free(reduced_partial_solutions);
+
+    return solutions_count % MOD;
+}
 
 int brickTiling(int grid_row_count, char** grid) {
     clock_t perf_start, perf_end;
@@ -288,7 +310,7 @@ int brickTiling(int grid_row_count, char** grid) {
     perf_start = clock();
 
     const int grid_col_count = (int)strlen(grid[0]);
-    printf("grid: %d x %d\n", grid_row_count, grid_col_count);
+    fprintf(stderr, "grid: %d x %d\n", grid_row_count, grid_col_count);
 
     if (is_grid_fully_blocked(grid, grid_row_count, grid_col_count)) {
         // Special case of grid having no free spaces
@@ -308,28 +330,66 @@ int brickTiling(int grid_row_count, char** grid) {
 
     if (partial_solutions_count < 1) {
         // Special case of spaces on board in which tiles can be placed
+        free(partial_solutions);
         return 0;
     }
 
+    const int count = (int) count_solutions(partial_solutions, partial_solutions_count, ps_len);
+
     for (int i = 0; i < partial_solutions_count; i++) {
-        print_partial_solution(ps_len, partial_solutions[i]);
         free(partial_solutions[i]);
     }
     free(partial_solutions);
 
     perf_end = clock();
-    printf("Time (s): %f\n", (perf_end - perf_start) / (double)CLOCKS_PER_SEC);
+    fprintf(stderr, "Time (s): %f\n", (perf_end - perf_start) / (double)CLOCKS_PER_SEC);
 
-    return -1;
+    return count;
 }
 
+// Reads grids in HackerRank input format from stdin and writes one count per
+// grid to stdout
 int main()
 {
-    char *test_data[2] = {
-      "....",
-      "...."
-    };
-    brickTiling(sizeof(test_data)/sizeof(test_data[0]), test_data);
+    int t;
+    if (scanf("%d", &t) != 1) {
+        return 1;
+    }
+
+    for (int t_itr = 0; t_itr < t; t_itr++) {
+        int n;
+        int m;
+        if (scanf("%d %d", &n, &m) != 2 || n <= 0 || m <= 0) {
+            return 1;
+        }
+
+        // Read at most m characters of each row, so a row that's too long
+        // can't overflow its buffer. It's rejected instead, along with one
+        // that's too short.
+        char row_format[32];
+        snprintf(row_format, sizeof(row_format), "%%%ds", m);
+
+        char** grid = (char**) calloc(n, sizeof(char*));
+        for (int i = 0; i < n; i++) {
+            grid[i] = (char*) calloc((size_t) m + 1, sizeof(char));
+            if (scanf(row_format, grid[i]) != 1 || (int) strlen(grid[i]) != m) {
+                return 1;
+            }
+            int next_char = getchar();
+            if (next_char != EOF && !isspace(next_char)) {
+                return 1;
+            }
+        }
+
+        printf("%d\n", brickTiling(n, grid));
+        fflush(stdout);
+
+        for (int i = 0; i < n; i++) {
+            free(grid[i]);
+        }
+        free(grid);
+    }
+
     return 0;
 }
 
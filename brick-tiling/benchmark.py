@@ -0,0 +1,359 @@
+#!/bin/python3
+
+import argparse
+import contextlib
+import fnmatch
+import importlib.util
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from generate_grids import generate_random_grid, generate_tileable_grid
+
+ATTEMPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ATTEMPT_FILE_NAMES = ['attempt-0{}.py'.format(i) for i in range(1, 8)]
+MULTI_ENGINE_ATTEMPT_FILE_NAME = 'attempt-07.py'
+
+# Grids with obstacles gathered from the test case lists of the attempts
+OBSTACLE_GRIDS = [
+    ['######', '######'],
+    ['...', '.##'],
+    ['....', '....', '..##', '.###', '.###'],
+    ['....', '....', '..#.', '.##.', '.#..'],
+    ['....', '....', '..#.', '..#.', '....', '#..#'],
+    ['###.#...', '#...###.'],
+    ['###....#', '#....###'],
+    ['###.....', '#.......'],
+    ['.....', '.....', '....#'] + ['.....'] * 10,
+]
+
+RANDOM_GRID_COUNT = 10
+RANDOM_GRID_SEED = 0
+RANDOM_GRID_DENSITY = 0.2
+
+# Loads a fresh copy of an attempt, so module level caches don't carry over
+# from one measurement to the next. Importing an attempt doesn't run its
+# test cases, but some print as they solve, so output is discarded.
+def load_attempt(file_name):
+    module_name = 'brick_tiling_{}'.format(file_name[:-len('.py')].replace('-', '_'))
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(ATTEMPTS_DIR, file_name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if hasattr(module, 'DEBUG'):
+        module.DEBUG = False
+    return module
+
+# Maps engine name -> (attempt file name, engine argument). The single-engine
+# attempts are registered by file name. Each engine of the multi-engine
+# attempt is registered as '<attempt>:<engine>'.
+def get_engines():
+    engines = {}
+    for file_name in ATTEMPT_FILE_NAMES:
+        if file_name != MULTI_ENGINE_ATTEMPT_FILE_NAME:
+            engines[file_name[:-len('.py')]] = (file_name, None)
+    multi_engine_attempt = load_attempt(MULTI_ENGINE_ATTEMPT_FILE_NAME)
+    for engine in multi_engine_attempt.ENGINES:
+        name = '{}:{}'.format(MULTI_ENGINE_ATTEMPT_FILE_NAME[:-len('.py')], engine)
+        engines[name] = (MULTI_ENGINE_ATTEMPT_FILE_NAME, engine)
+    return engines
+
+# Each case is a dict with a name, a family and a grid. Cases within a
+# family are ordered from smallest to largest.
+def create_corpus(random_grid_count=RANDOM_GRID_COUNT, seed=RANDOM_GRID_SEED):
+    corpus = []
+    for row_count in range(1, 21):
+        corpus.append({
+            'name': 'unobstructed-{}x8'.format(row_count),
+            'family': 'unobstructed',
+            'grid': ['.' * 8] * row_count,
+        })
+
+    for i, grid in enumerate(OBSTACLE_GRIDS):
+        corpus.append({
+            'name': 'obstacles-{:02d}-{}x{}'.format(i + 1, len(grid), len(grid[0])),
+            'family': 'obstacles',
+            'grid': grid,
+        })
+
+    rng = random.Random(seed)
+    random_cases = []
+    for i in range(random_grid_count):
+        row_count = rng.randint(1, 20)
+        col_count = rng.randint(1, 8)
+        random_cases.append({
+            'name': 'random-{:02d}-{}x{}'.format(i + 1, row_count, col_count),
+            'family': 'random',
+            'grid': generate_random_grid(rng, row_count, col_count, RANDOM_GRID_DENSITY),
+        })
+    corpus.extend(sorted(random_cases, key=lambda case: get_free_point_count(case['grid'])))
+
+    tileable_cases = []
+    for i in range(random_grid_count):
+        row_count = rng.randint(1, 20)
+        col_count = rng.randint(1, 8)
+        tileable_cases.append({
+            'name': 'tileable-{:02d}-{}x{}'.format(i + 1, row_count, col_count),
+            'family': 'tileable',
+            'grid': generate_tileable_grid(rng, row_count, col_count, RANDOM_GRID_DENSITY),
+        })
+    corpus.extend(sorted(tileable_cases, key=lambda case: get_free_point_count(case['grid'])))
+
+    return corpus
+
+def get_free_point_count(grid):
+    return sum(row.count('.') for row in grid)
+
+def solve(module, engine, grid, workers=None):
+    if engine is None:
+        return module.brick_tiling(grid)
+    if workers is not None:
+        return module.brick_tiling(grid, engine, workers)
+    return module.brick_tiling(grid, engine)
+
+# Runs in a child process so a slow case can be stopped. Times warmup +
+# repeats solves, each on a fresh copy of the attempt, then solves once more
+# under tracemalloc for the peak memory (tracing slows the solve, so that
+# run isn't timed).
+def measure_case(file_name, engine, grid, warmup, repeats, workers, connection):
+    # A persistent result store would answer from disk instead of solving
+    os.environ.pop('BRICK_TILING_RESULT_STORE', None)
+    try:
+        durations_ns = []
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            for i in range(warmup + repeats):
+                module = load_attempt(file_name)
+                start = time.perf_counter_ns()
+                count = solve(module, engine, grid, workers)
+                duration_ns = time.perf_counter_ns() - start
+                if i >= warmup:
+                    durations_ns.append(duration_ns)
+
+            module = load_attempt(file_name)
+            tracemalloc.start()
+            solve(module, engine, grid, workers)
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        connection.send({'count': count, 'durations_ns': durations_ns, 'peak_bytes': peak_bytes})
+    except Exception as e:
+        connection.send({'error': '{}: {}'.format(type(e).__name__, e)})
+
+def get_percentile(sorted_values, percentile):
+    rank = max(1, math.ceil(percentile / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def run_case(engine_name, engines, case, warmup, repeats, timeout, workers=None):
+    file_name, engine = engines[engine_name]
+    result = {
+        'engine': engine_name,
+        'case': case['name'],
+        'family': case['family'],
+        'rows': len(case['grid']),
+        'cols': len(case['grid'][0]),
+    }
+
+    parent_connection, child_connection = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(
+        target=measure_case,
+        args=(file_name, engine, case['grid'], warmup, repeats, workers, child_connection)
+    )
+    process.start()
+    child_connection.close()
+    if parent_connection.poll(timeout):
+        try:
+            measurement = parent_connection.recv()
+        except EOFError:
+            measurement = {'error': 'worker exited with code {}'.format(process.exitcode)}
+        process.join()
+    else:
+        process.terminate()
+        process.join()
+        result['status'] = 'timeout'
+        return result
+
+    if 'error' in measurement:
+        result['status'] = 'error'
+        result['error'] = measurement['error']
+        return result
+
+    durations_ns = sorted(measurement['durations_ns'])
+    result['status'] = 'ok'
+    result['count'] = measurement['count']
+    result['repeats'] = len(durations_ns)
+    result['min_ns'] = durations_ns[0]
+    result['median_ns'] = int(statistics.median(durations_ns))
+    result['p95_ns'] = get_percentile(durations_ns, 95)
+    result['peak_bytes'] = measurement['peak_bytes']
+    return result
+
+def format_duration(duration_ns):
+    if duration_ns is None:
+        return '-'
+    return '{:.3f}ms'.format(duration_ns / 10 ** 6)
+
+def format_result(result):
+    if result['status'] != 'ok':
+        return '{:<30} {:<24} {}'.format(result['engine'], result['case'], result['status'])
+    return '{:<30} {:<24} median {:>12} p95 {:>12} peak {:>8.1f}KiB count {}'.format(
+        result['engine'],
+        result['case'],
+        format_duration(result['median_ns']),
+        format_duration(result['p95_ns']),
+        result['peak_bytes'] / 1024,
+        result['count']
+    )
+
+# Runs every selected engine over every selected case. Once an engine runs
+# out of time on a case, the larger cases of the same family are skipped for
+# that engine.
+def run_benchmark(
+    engine_names,
+    cases,
+    warmup=1,
+    repeats=5,
+    timeout=60,
+    workers=None,
+    log_stream=sys.stderr
+):
+    engines = get_engines()
+    for engine_name in engine_names:
+        if engine_name not in engines:
+            raise Exception('Unknown engine: {}'.format(engine_name))
+
+    results = []
+    for engine_name in engine_names:
+        timed_out_families = set()
+        for case in cases:
+            if case['family'] in timed_out_families:
+                result = {
+                    'engine': engine_name,
+                    'case': case['name'],
+                    'family': case['family'],
+                    'rows': len(case['grid']),
+                    'cols': len(case['grid'][0]),
+                    'status': 'skipped',
+                }
+            else:
+                result = run_case(engine_name, engines, case, warmup, repeats, timeout, workers)
+                if result['status'] == 'timeout':
+                    timed_out_families.add(case['family'])
+            results.append(result)
+            if log_stream:
+                log_stream.write(format_result(result) + '\n')
+                log_stream.flush()
+
+    return {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'warmup': warmup,
+        'repeats': repeats,
+        'timeout': timeout,
+        'workers': workers,
+        'results': results,
+    }
+
+# Compares the median times of the cases both runs completed. A ratio above
+# 1 means the current run was slower.
+def compare_benchmarks(baseline, current, output_stream=sys.stdout):
+    baseline_results = {
+        (result['engine'], result['case']): result
+        for result in baseline['results']
+    }
+    output_stream.write('{:<30} {:<24} {:>12} {:>12} {:>8}\n'.format(
+        'engine', 'case', 'baseline', 'current', 'ratio'
+    ))
+    for result in current['results']:
+        baseline_result = baseline_results.get((result['engine'], result['case']))
+        if baseline_result is None:
+            continue
+        if result['status'] != 'ok' or baseline_result['status'] != 'ok':
+            ratio = '{}/{}'.format(baseline_result['status'], result['status'])
+        else:
+            ratio = '{:.2f}'.format(result['median_ns'] / max(baseline_result['median_ns'], 1))
+            if result['count'] != baseline_result['count']:
+                ratio += ' count changed'
+        output_stream.write('{:<30} {:<24} {:>12} {:>12} {:>8}\n'.format(
+            result['engine'],
+            result['case'],
+            format_duration(baseline_result.get('median_ns')),
+            format_duration(result.get('median_ns')),
+            ratio
+        ))
+
+def select_cases(corpus, patterns):
+    if not patterns:
+        return corpus
+    return [
+        case for case in corpus
+        if any(fnmatch.fnmatch(case['name'], pattern) for pattern in patterns)
+    ]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the brick tiling attempts')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='run the benchmark')
+    run_parser.add_argument(
+        '--engines',
+        nargs='+',
+        default=['attempt-07:bitboard'],
+        help='engines to run (see the list command)'
+    )
+    run_parser.add_argument(
+        '--cases',
+        nargs='+',
+        help='glob patterns of the case names to run, e.g. "unobstructed-*"'
+    )
+    run_parser.add_argument('--warmup', type=int, default=1)
+    run_parser.add_argument('--repeats', type=int, default=5)
+    run_parser.add_argument(
+        '--timeout',
+        type=float,
+        default=60,
+        help='seconds allowed per case, across its warmup and repeats'
+    )
+    run_parser.add_argument(
+        '--workers',
+        type=int,
+        help='processes each solve may use (any engine, up to 2)'
+    )
+    run_parser.add_argument('--random-grids', type=int, default=RANDOM_GRID_COUNT)
+    run_parser.add_argument('--seed', type=int, default=RANDOM_GRID_SEED)
+    run_parser.add_argument('--output', help='write the results as JSON to this path')
+    run_parser.add_argument('--baseline', help='compare against the results saved at this path')
+
+    compare_parser = subparsers.add_parser('compare', help='compare two saved runs')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+
+    subparsers.add_parser('list', help='list the engines and cases')
+
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for engine_name in get_engines():
+            print(engine_name)
+        for case in create_corpus():
+            print(case['name'])
+    elif args.command == 'compare':
+        with open(args.baseline) as baseline_file, open(args.current) as current_file:
+            compare_benchmarks(json.load(baseline_file), json.load(current_file))
+    else:
+        cases = select_cases(create_corpus(args.random_grids, args.seed), args.cases)
+        benchmark = run_benchmark(
+            args.engines, cases, args.warmup, args.repeats, args.timeout, args.workers
+        )
+        if args.output:
+            with open(args.output, 'w') as output_file:
+                json.dump(benchmark, output_file, indent=2)
+        if args.baseline:
+            with open(args.baseline) as baseline_file:
+                compare_benchmarks(json.load(baseline_file), benchmark)
@@ -0,0 +1,252 @@
+#!/bin/python3
+
+import argparse
+import io
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmark import ATTEMPTS_DIR, get_engines, load_attempt, solve
+from generate_grids import generate_grids, parse_fraction, write_grids
+
+C_SOLVER_SOURCE_FILE_NAME = 'attempt-08.c'
+C_SOLVER_ENGINE_NAME = 'attempt-08'
+REFERENCE_ENGINE_NAME = 'attempt-07:profile'
+MOD = 10 ** 9 + 7
+
+RANDOM_GRID_COUNT = 30
+RANDOM_GRID_SEED = 0
+RANDOM_GRID_MAX_ROW_COUNT = 8
+RANDOM_GRID_MAX_COL_COUNT = 8
+RANDOM_GRID_DENSITY = 0.1
+RANDOM_GRID_TILEABLE_FRACTION = 0.5
+
+def format_grids(grids):
+    text = io.StringIO()
+    write_grids(grids, text)
+    return text.getvalue()
+
+# Compiles the C attempt into output_dir with the compiler named by $CC (or
+# cc/gcc). Returns the path of the binary, or None if there's no compiler.
+def build_c_solver(output_dir):
+    compiler = os.environ.get('CC') or shutil.which('cc') or shutil.which('gcc')
+    if compiler is None:
+        return None
+    binary_path = os.path.join(output_dir, 'brick-tiling-c')
+    process = subprocess.run(
+        [
+            compiler,
+            '-O2',
+            '-std=c99',
+            '-o',
+            binary_path,
+            os.path.join(ATTEMPTS_DIR, C_SOLVER_SOURCE_FILE_NAME)
+        ],
+        capture_output=True,
+        text=True
+    )
+    if process.returncode != 0:
+        raise Exception('Failed to build {}:\n{}'.format(C_SOLVER_SOURCE_FILE_NAME, process.stderr))
+    return binary_path
+
+# Each solver yields (index, count, duration_ns, status) per grid, with the
+# count reduced modulo MOD. A grid that runs out of time gets a None count,
+# and the solver carries on with the grid after it.
+def run_c_solver(binary_path, grids, timeout):
+    for index, grid in enumerate(grids):
+        start = time.perf_counter_ns()
+        try:
+            process = subprocess.run(
+                [binary_path],
+                input=format_grids([grid]),
+                capture_output=True,
+                text=True,
+                timeout=timeout
+            )
+        except subprocess.TimeoutExpired:
+            yield index, None, None, 'timeout'
+            continue
+        duration_ns = time.perf_counter_ns() - start
+        if process.returncode != 0:
+            yield index, None, None, 'error'
+        else:
+            yield index, int(process.stdout.split()[0]) % MOD, duration_ns, 'ok'
+
+def solve_grids_in_child(file_name, engine, grids, first_index, connection):
+    os.environ.pop('BRICK_TILING_RESULT_STORE', None)
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull
+        for index in range(first_index, len(grids)):
+            # A fresh copy of the attempt per grid, so none of them is
+            # answered from a memo filled while solving another
+            try:
+                module = load_attempt(file_name)
+                start = time.perf_counter_ns()
+                count = solve(module, engine, grids[index])
+                duration_ns = time.perf_counter_ns() - start
+            except Exception as e:
+                connection.send((index, None, None, 'error: {}: {}'.format(type(e).__name__, e)))
+                continue
+            connection.send((index, count % MOD, duration_ns, 'ok'))
+
+def run_python_engine(file_name, engine, grids, timeout):
+    next_index = 0
+    while next_index < len(grids):
+        parent_connection, child_connection = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(
+            target=solve_grids_in_child,
+            args=(file_name, engine, grids, next_index, child_connection)
+        )
+        process.start()
+        child_connection.close()
+        while next_index < len(grids):
+            if not parent_connection.poll(timeout):
+                process.terminate()
+                yield next_index, None, None, 'timeout'
+                next_index += 1
+                break
+            try:
+                result = parent_connection.recv()
+            except EOFError:
+                yield next_index, None, None, 'error'
+                next_index += 1
+                break
+            yield result
+            next_index = result[0] + 1
+        process.join()
+
+# Solves every grid with every engine. Returns {engine name: [result per
+# grid]}, where each result is a (count, duration_ns, status) tuple.
+def run_engines(engine_names, grids, timeout=10, c_solver_path=None, log_stream=sys.stderr):
+    engines = get_engines()
+    results = {}
+    for engine_name in engine_names:
+        if engine_name == C_SOLVER_ENGINE_NAME:
+            if c_solver_path is None:
+                raise Exception('The C solver has not been built')
+            engine_results = run_c_solver(c_solver_path, grids, timeout)
+        elif engine_name in engines:
+            file_name, engine = engines[engine_name]
+            engine_results = run_python_engine(file_name, engine, grids, timeout)
+        else:
+            raise Exception('Unknown engine: {}'.format(engine_name))
+
+        results[engine_name] = [None] * len(grids)
+        for index, count, duration_ns, status in engine_results:
+            results[engine_name][index] = (count, duration_ns, status)
+        if log_stream:
+            log_stream.write('{}: done\n'.format(engine_name))
+            log_stream.flush()
+    return results
+
+# A grid's expected count comes from the reference engine when it solved the
+# grid, or else from the most common count. Any engine that solved the grid
+# with another count disagrees.
+def find_disagreements(results, grid_count, reference_engine_name=REFERENCE_ENGINE_NAME):
+    disagreements = []
+    for index in range(grid_count):
+        counts = {
+            engine_name: engine_results[index][0]
+            for engine_name, engine_results in results.items()
+            if engine_results[index][2] == 'ok'
+        }
+        if not counts:
+            continue
+        if reference_engine_name in counts:
+            expected_count = counts[reference_engine_name]
+        else:
+            values = list(counts.values())
+            expected_count = max(values, key=values.count)
+        wrong_counts = {
+            engine_name: count
+            for engine_name, count in counts.items()
+            if count != expected_count
+        }
+        if wrong_counts:
+            disagreements.append((index, expected_count, wrong_counts))
+    return disagreements
+
+def print_report(results, grids, disagreements, output_stream=sys.stdout):
+    disagreement_counts = {engine_name: 0 for engine_name in results}
+    for _, _, wrong_counts in disagreements:
+        for engine_name in wrong_counts:
+            disagreement_counts[engine_name] += 1
+
+    output_stream.write('{:<30} {:>6} {:>8} {:>6} {:>9} {:>12} {:>10}\n'.format(
+        'engine', 'solved', 'timeout', 'error', 'disagree', 'total', 'grids/s'
+    ))
+    for engine_name, engine_results in results.items():
+        solved = [result for result in engine_results if result[2] == 'ok']
+        total_ns = sum(result[1] for result in solved)
+        output_stream.write('{:<30} {:>6} {:>8} {:>6} {:>9} {:>10.3f}ms {:>10.1f}\n'.format(
+            engine_name,
+            len(solved),
+            sum(1 for result in engine_results if result[2] == 'timeout'),
+            sum(1 for result in engine_results if result[2] not in ('ok', 'timeout')),
+            disagreement_counts[engine_name],
+            total_ns / 10 ** 6,
+            len(solved) / (total_ns / 10 ** 9) if total_ns else 0
+        ))
+
+    for engine_name, engine_results in results.items():
+        errors = [result[2] for result in engine_results if result[2].startswith('error')]
+        if errors:
+            output_stream.write('{} failed on {} grids, first with {}\n'.format(
+                engine_name, len(errors), errors[0]
+            ))
+
+    for index, expected_count, wrong_counts in disagreements:
+        output_stream.write('\nDisagreement on grid {} (expected {}):\n'.format(index, expected_count))
+        for row in grids[index]:
+            output_stream.write('  {}\n'.format(row))
+        for engine_name, count in sorted(wrong_counts.items()):
+            output_stream.write('  {}: {}\n'.format(engine_name, count))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Checks that the brick tiling engines, including the C attempt, agree on random grids'
+    )
+    parser.add_argument(
+        '--engines',
+        nargs='+',
+        help='engines to compare (default: every Python engine and the C attempt)'
+    )
+    parser.add_argument('--grids', type=int, default=RANDOM_GRID_COUNT)
+    parser.add_argument('--seed', type=int, default=RANDOM_GRID_SEED)
+    parser.add_argument('--max-rows', type=int, default=RANDOM_GRID_MAX_ROW_COUNT)
+    parser.add_argument('--max-cols', type=int, default=RANDOM_GRID_MAX_COL_COUNT)
+    parser.add_argument('--density', type=parse_fraction, default=RANDOM_GRID_DENSITY)
+    parser.add_argument('--clustering', type=parse_fraction, default=0.0)
+    parser.add_argument('--tileable-fraction', type=parse_fraction, default=RANDOM_GRID_TILEABLE_FRACTION)
+    parser.add_argument('--timeout', type=float, default=10, help='seconds allowed per grid')
+    parser.add_argument('--reference', default=REFERENCE_ENGINE_NAME)
+    args = parser.parse_args()
+
+    grids = list(generate_grids(
+        args.grids,
+        args.seed,
+        (1, args.max_rows),
+        (1, args.max_cols),
+        args.density,
+        args.clustering,
+        args.tileable_fraction
+    ))
+    engine_names = args.engines or list(get_engines()) + [C_SOLVER_ENGINE_NAME]
+
+    with tempfile.TemporaryDirectory() as build_dir:
+        c_solver_path = None
+        if C_SOLVER_ENGINE_NAME in engine_names:
+            c_solver_path = build_c_solver(build_dir)
+            if c_solver_path is None:
+                sys.stderr.write('No C compiler found, so skipping {}\n'.format(C_SOLVER_ENGINE_NAME))
+                engine_names.remove(C_SOLVER_ENGINE_NAME)
+
+        results = run_engines(engine_names, grids, args.timeout, c_solver_path)
+
+    disagreements = find_disagreements(results, len(grids), args.reference)
+    print_report(results, grids, disagreements)
+    sys.exit(1 if disagreements else 0)
@@ -0,0 +1,183 @@
+#!/bin/python3
+
+import argparse
+import random
+import sys
+
+MAX_ROW_COUNT = 20
+MAX_COL_COUNT = 8
+
+# The points of each L tile orientation, relative to its elbow
+TILE_SHAPES = [
+    [(1, 0), (0, 0), (0, 1), (0, 2)],
+    [(-1, 0), (0, 0), (0, -1), (0, -2)],
+    [(-1, 0), (0, 0), (0, 1), (0, 2)],
+    [(1, 0), (0, 0), (0, -1), (0, -2)],
+    [(0, 1), (0, 0), (-1, 0), (-2, 0)],
+    [(0, -1), (0, 0), (1, 0), (2, 0)],
+    [(0, 1), (0, 0), (1, 0), (2, 0)],
+    [(0, -1), (0, 0), (-1, 0), (-2, 0)],
+]
+
+def get_neighbors(row_count, col_count, point):
+    row, col = point
+    for neighbor_row, neighbor_col in [(row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)]:
+        if 0 <= neighbor_row < row_count and 0 <= neighbor_col < col_count:
+            yield (neighbor_row, neighbor_col)
+
+def create_text_grid(row_count, col_count, blocked_points):
+    return [
+        ''.join('#' if (row, col) in blocked_points else '.' for col in range(col_count))
+        for row in range(row_count)
+    ]
+
+# Blocks round(density * points) points of the grid. With no clustering the
+# points are spread uniformly. Otherwise each point is, with probability
+# clustering, placed next to one already blocked, so obstacles grow in clumps.
+def generate_random_grid(rng, row_count, col_count, density, clustering=0.0):
+    free_points = [(row, col) for row in range(row_count) for col in range(col_count)]
+    blocked_points = set()
+    blocked_point_count = round(density * len(free_points))
+    while len(blocked_points) < blocked_point_count:
+        point = None
+        if blocked_points and rng.random() < clustering:
+            frontier = sorted(set(
+                neighbor
+                for blocked_point in blocked_points
+                for neighbor in get_neighbors(row_count, col_count, blocked_point)
+                if neighbor not in blocked_points
+            ))
+            if frontier:
+                point = rng.choice(frontier)
+        if point is None:
+            point = rng.choice(free_points)
+        free_points.remove(point)
+        blocked_points.add(point)
+    return create_text_grid(row_count, col_count, blocked_points)
+
+# Builds a grid that has at least one tiling. L tiles are placed at random
+# positions, skipping any that overlap ones already placed, until they cover
+# (1 - density) of the grid or nothing else fits. Every point left uncovered
+# is blocked, so the placed tiles are a tiling of what's free.
+def generate_tileable_grid(rng, row_count, col_count, density):
+    placements = [
+        [(row + row_offset, col + col_offset) for row_offset, col_offset in shape]
+        for row in range(row_count)
+        for col in range(col_count)
+        for shape in TILE_SHAPES
+    ]
+    placements = [
+        placement for placement in placements
+        if all(0 <= row < row_count and 0 <= col < col_count for row, col in placement)
+    ]
+    rng.shuffle(placements)
+
+    covered_point_target = (1 - density) * row_count * col_count
+    covered_points = set()
+    for placement in placements:
+        if len(covered_points) >= covered_point_target:
+            break
+        if not any(point in covered_points for point in placement):
+            covered_points.update(placement)
+
+    blocked_points = set(
+        (row, col)
+        for row in range(row_count)
+        for col in range(col_count)
+        if (row, col) not in covered_points
+    )
+    return create_text_grid(row_count, col_count, blocked_points)
+
+# Yields count grids with dimensions drawn uniformly from the given ranges.
+# Each is tileable by construction with probability tileable_fraction, and
+# otherwise has randomly placed obstacles. The same seed always gives the
+# same grids.
+def generate_grids(
+    count,
+    seed=0,
+    row_range=(1, MAX_ROW_COUNT),
+    col_range=(1, MAX_COL_COUNT),
+    density=0.1,
+    clustering=0.0,
+    tileable_fraction=0.0
+):
+    rng = random.Random(seed)
+    for _ in range(count):
+        row_count = rng.randint(*row_range)
+        col_count = rng.randint(*col_range)
+        if rng.random() < tileable_fraction:
+            yield generate_tileable_grid(rng, row_count, col_count, density)
+        else:
+            yield generate_random_grid(rng, row_count, col_count, density, clustering)
+
+# Writes the grids in HackerRank input format
+def write_grids(grids, output_stream):
+    grids = list(grids)
+    output_stream.write('{}\n'.format(len(grids)))
+    for grid in grids:
+        output_stream.write('{} {}\n'.format(len(grid), len(grid[0])))
+        for row in grid:
+            output_stream.write('{}\n'.format(row))
+
+def parse_range(text, max_value):
+    low, _, high = text.partition('-')
+    low = int(low)
+    high = int(high) if high else low
+    if not 1 <= low <= high <= max_value:
+        raise argparse.ArgumentTypeError('expected a range within 1-{}'.format(max_value))
+    return (low, high)
+
+def parse_fraction(text):
+    value = float(text)
+    if not 0 <= value <= 1:
+        raise argparse.ArgumentTypeError('expected a fraction within 0-1')
+    return value
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Writes seeded random brick tiling grids in HackerRank input format'
+    )
+    parser.add_argument('--count', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--rows',
+        type=lambda text: parse_range(text, MAX_ROW_COUNT),
+        default=(1, MAX_ROW_COUNT),
+        help='row count or range, e.g. 8 or 1-20'
+    )
+    parser.add_argument(
+        '--cols',
+        type=lambda text: parse_range(text, MAX_COL_COUNT),
+        default=(1, MAX_COL_COUNT),
+        help='column count or range, e.g. 8 or 1-8'
+    )
+    parser.add_argument('--density', type=parse_fraction, default=0.1, help='fraction of points blocked')
+    parser.add_argument(
+        '--clustering',
+        type=parse_fraction,
+        default=0.0,
+        help='chance each obstacle is placed next to an earlier one'
+    )
+    parser.add_argument(
+        '--tileable-fraction',
+        type=parse_fraction,
+        default=0.0,
+        help='fraction of grids built from randomly placed tiles, so they have a tiling'
+    )
+    parser.add_argument('--output', help='write to this path instead of stdout')
+    args = parser.parse_args()
+
+    grids = generate_grids(
+        args.count,
+        args.seed,
+        args.rows,
+        args.cols,
+        args.density,
+        args.clustering,
+        args.tileable_fraction
+    )
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            write_grids(grids, output_file)
+    else:
+        write_grids(grids, sys.stdout)